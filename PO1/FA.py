@@ -9,7 +9,18 @@
 
 # DO NOT MODIFY THIS FILE
 
+import os
 import sys
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is only needed for the batch runner
+    np = None
 
 
 class FAError(Exception):
@@ -24,6 +35,10 @@ class TransitionError(FAError):
     pass
 
 
+class RegexError(FAError):
+    pass
+
+
 class FA:
     """
     Finite Automaton (FA)
@@ -128,6 +143,466 @@ class FA:
     def reset(self) -> None:
         self.current_state = self.start_state
 
+    def minimize(self, keep_final_names: bool = False) -> 'FA':
+        """
+        Create the minimal FA that accepts the same language. Unreachable
+        states and dead states (from which no final state can be reached) are
+        removed and equivalent states are merged using Hopcroft's partition
+        refinement. A merged state is named after its first state in Q.
+
+        A transition into a removed dead state becomes a missing transition,
+        which FA.transition already reports as a failure.
+
+        keep_final_names: Never merge final states with different names, for
+                          automata like the lexer where the name of the final
+                          state is the token type
+        """
+        # Keep the states that are reachable from the start state
+        reachable = {self.start_state.name}
+        queue = [self.start_state.name]
+        while queue:
+            state = self.states[queue.pop()]
+            for next_state in state.transition_table.values():
+                if next_state not in reachable:
+                    reachable.add(next_state)
+                    queue.append(next_state)
+
+        # ... and from which a final state can be reached
+        predecessors = {name: set() for name in reachable}
+        for name in reachable:
+            for next_state in self.states[name].transition_table.values():
+                predecessors[next_state].add(name)
+
+        live = {state.name for state in self.final_states} & reachable
+        queue = list(live)
+        while queue:
+            for name in predecessors[queue.pop()]:
+                if name not in live:
+                    live.add(name)
+                    queue.append(name)
+
+        final_names = {state.name for state in self.final_states}
+        names = [name for name in self.states if name in live]
+        if self.start_state.name not in live:
+            # The FA accepts nothing
+            return FA([self.start_state.name], self.input_alphabet, {},
+                      self.start_state.name, [], self.verbose)
+
+        # Hopcroft's algorithm on the completed automaton, where every missing
+        # transition leads to an extra sink state with code 'sink'.
+        sink = len(names)
+        index = {name: code for code, name in enumerate(names)}
+        inverse = {}
+        for symbol in self.input_alphabet:
+            inverse[symbol] = [[] for _ in range(sink + 1)]
+            for code, name in enumerate(names):
+                next_state = self.states[name].transition_table.get(symbol)
+                inverse[symbol][index.get(next_state, sink)].append(code)
+            inverse[symbol][sink].append(sink)
+
+        initial_blocks = {}
+        for code, name in enumerate(names):
+            if name not in final_names:
+                key = None
+            elif keep_final_names:
+                key = name
+            else:
+                key = True
+            initial_blocks.setdefault(key, []).append(code)
+        initial_blocks.setdefault(None, []).append(sink)
+
+        blocks = [set(block) for block in initial_blocks.values()]
+        block_of = [0] * (sink + 1)
+        for block_id, block in enumerate(blocks):
+            for code in block:
+                block_of[code] = block_id
+
+        largest = max(range(len(blocks)), key=lambda i: len(blocks[i]))
+        waiting = {i for i in range(len(blocks)) if i != largest}
+        while waiting:
+            splitter = list(blocks[waiting.pop()])
+            for symbol in self.input_alphabet:
+                # All states with a transition on 'symbol' into the splitter
+                incoming = {}
+                for code in splitter:
+                    for previous in inverse[symbol][code]:
+                        incoming.setdefault(block_of[previous],
+                                            set()).add(previous)
+
+                for block_id, inside in incoming.items():
+                    if len(inside) == len(blocks[block_id]):
+                        continue
+
+                    # Split the block, the new block gets the states in
+                    # 'inside'
+                    blocks[block_id] -= inside
+                    new_id = len(blocks)
+                    blocks.append(inside)
+                    for code in inside:
+                        block_of[code] = new_id
+
+                    if block_id in waiting or \
+                            len(inside) <= len(blocks[block_id]):
+                        waiting.add(new_id)
+                    else:
+                        waiting.add(block_id)
+
+        # Build the minimal FA, naming every block after its first state
+        sink_block = block_of[sink]
+        block_name = {}
+        for code, name in enumerate(names):
+            block_name.setdefault(block_of[code], name)
+
+        Q = [name for code, name in enumerate(names)
+             if block_name[block_of[code]] == name]
+        delta = {}
+        for name in Q:
+            transitions = {}
+            for symbol, next_state in \
+                    self.states[name].transition_table.items():
+                if next_state in index and \
+                        block_of[index[next_state]] != sink_block:
+                    transitions[symbol] = \
+                        block_name[block_of[index[next_state]]]
+            if transitions:
+                delta[name] = transitions
+        s = block_name[block_of[index[self.start_state.name]]]
+        F = [name for name in Q if name in final_names]
+
+        return FA(Q, self.input_alphabet, delta, s, F, self.verbose)
+
+    def compile(self, ignore: Iterable[str] = ()) -> 'CompiledFA':
+        """
+        Compile the FA into a table-driven form for fast runs over complete
+        symbol sequences, see CompiledFA
+
+        ignore: Symbols outside of Sigma that leave the state unchanged, e.g.
+                'SPACE' tokens when verifying steps
+        """
+        return CompiledFA(self, ignore)
+
+    def run_batch(self,
+                  list_of_symbols: Sequence[Sequence[str]],
+                  ignore: Iterable[str] = ()) -> 'np.ndarray':
+        """
+        Run the FA against many complete inputs at once, see
+        CompiledFA.run_batch
+        returns: A boolean NumPy array, True for every accepted input
+        """
+        return self.compile(ignore).run_batch(list_of_symbols)
+
+
+class CompiledFA:
+    """
+    Compiled Finite Automaton (FA)
+
+    States are integer coded and all transitions live in one flat table.
+    Symbols that lead to the same next state from every state are merged into
+    a single alphabet equivalence class, i.e. a single table column. A state
+    is coded by the offset of its row in the table, so a transition costs one
+    dict lookup and one list index:
+
+        state = table[state + symbol_classes[symbol]]
+
+    Missing transitions lead to an explicit dead state that never accepts.
+    Unlike FA.transition, which stays in the current state when a transition
+    is missing, a run that hits a missing transition is rejected (as
+    verify_steps does).
+    """
+
+    def __init__(self, fa: FA, ignore: Iterable[str] = ()):
+        """
+        fa:     The FA to compile
+
+        ignore: Symbols outside of Sigma that leave the state unchanged
+        """
+        names = list(fa.states)
+        index = {name: code for code, name in enumerate(names)}
+        dead = len(names)
+
+        # Build the column of every symbol and merge identical columns into
+        # one alphabet equivalence class.
+        columns = {}
+        symbol_classes = {}
+        for symbol in fa.input_alphabet:
+            column = tuple(
+                index.get(state.transition_table.get(symbol), dead)
+                for state in fa.states.values())
+            symbol_classes[symbol] = columns.setdefault(column, len(columns))
+
+        for symbol in ignore:
+            if symbol in fa.input_alphabet:
+                raise TransitionError(f"Ignored symbol '{symbol}' should not "
+                                      f"be in Sigma: {fa.input_alphabet}")
+            column = tuple(range(dead))
+            symbol_classes[symbol] = columns.setdefault(column, len(columns))
+
+        # Keep at least one column, so that the states get distinct codes
+        if not columns:
+            columns[(dead,) * dead] = 0
+
+        width = len(columns)
+        table = [dead * width] * ((dead + 1) * width)
+        for column, symbol_class in columns.items():
+            for code, next_code in enumerate(column):
+                table[code * width + symbol_class] = next_code * width
+
+        # Retain and assign variables
+        self.state_names = names
+        self.symbol_classes = symbol_classes
+        self.width = width
+        self.table = table
+        self.start = index[fa.start_state.name] * width
+        self.dead = dead * width
+        self.final = frozenset(index[state.name] * width
+                               for state in fa.final_states)
+
+    def step(self, state: int, symbol: str) -> int:
+        """
+        Follow the transition 'symbol' from the state coded by 'state'
+        returns: The code of the next state, the dead state if there is none
+        """
+        try:
+            return self.table[state + self.symbol_classes[symbol]]
+        except KeyError:
+            return self.dead
+
+    def run(self, symbols: Iterable[str], state: int | None = None) -> int:
+        """
+        Follow the transitions for all 'symbols', starting from the state coded
+        by 'state' (the start state by default)
+        returns: The code of the reached state, the dead state as soon as a
+                 transition is missing
+        """
+        table = self.table
+        symbol_classes = self.symbol_classes
+        dead = self.dead
+        if state is None:
+            state = self.start
+
+        try:
+            for symbol in symbols:
+                state = table[state + symbol_classes[symbol]]
+                if state == dead:
+                    break
+        except KeyError:
+            # Symbol not in Sigma
+            return dead
+
+        return state
+
+    def accepts(self, symbols: Iterable[str]) -> bool:
+        """
+        Check whether the complete input 'symbols' leads to a final state
+        """
+        return self.run(symbols) in self.final
+
+    # Below this number of rows, the NumPy overhead per input column costs
+    # more than running the rows one by one
+    scalar_rows = 128
+
+    def run_batch(self,
+                  list_of_symbols: Sequence[Sequence[str]]) -> 'np.ndarray':
+        """
+        Run all inputs in 'list_of_symbols' in lockstep. The inputs are sorted
+        by length and split into buckets of similar lengths, so short inputs
+        are not padded to the longest one. Within a bucket the inputs are
+        encoded as a matrix of symbol classes, and a vector holding the current
+        state of every input advances one column at a time with a single
+        NumPy indexing operation. The inputs that have ended are dropped from
+        the vector, and once fewer than 'scalar_rows' are left they finish
+        with run.
+        returns: A boolean NumPy array, True for every accepted input
+        """
+        if np is None:
+            raise FAError("NumPy is required for CompiledFA.run_batch")
+
+        width = self.width
+
+        # One extra column: symbols not in Sigma lead to the dead state
+        table = np.array(self.table, dtype=np.intp).reshape(-1, width)
+        table //= width
+        dead = np.full((len(table), 1), self.dead // width, dtype=np.intp)
+        table = np.hstack([table, dead])
+
+        states = np.empty(len(list_of_symbols), dtype=np.intp)
+        order = sorted(range(len(list_of_symbols)),
+                       key=lambda row: len(list_of_symbols[row]))
+        start = 0
+        while start < len(order):
+            # Bucket of the inputs at most about twice as long
+            limit = 2 * len(list_of_symbols[order[start]]) + 16
+            end = start
+            while (end < len(order) and
+                   len(list_of_symbols[order[end]]) <= limit):
+                end += 1
+            self.run_bucket(list_of_symbols, order[start:end], table, states)
+            start = end
+
+        final = np.zeros(len(table), dtype=bool)
+        final[[state // width for state in self.final]] = True
+
+        return final[states]
+
+    def run_bucket(self,
+                   list_of_symbols: Sequence[Sequence[str]],
+                   bucket: list[int],
+                   table: 'np.ndarray',
+                   states: 'np.ndarray') -> None:
+        """
+        Run the inputs at the indices 'bucket' of 'list_of_symbols', sorted by
+        length, in lockstep, see run_batch, and set the rows of their reached
+        states in 'states'
+        """
+        width = self.width
+        unknown = width
+
+        lengths = [len(list_of_symbols[index]) for index in bucket]
+        inputs = np.full((len(bucket), lengths[-1]), unknown,
+                         dtype=np.uint8 if unknown < 256 else np.intp)
+        code = self.symbol_classes.get
+        for input_row, index in zip(inputs, bucket):
+            symbols = list_of_symbols[index]
+            input_row[:len(symbols)] = list(
+                map(code, symbols, repeat(unknown, len(symbols))))
+
+        current = np.full(len(bucket), self.start // width, dtype=np.intp)
+        first = 0
+        for column in range(lengths[-1]):
+            # The inputs are sorted, so the ones that have ended are a prefix
+            while lengths[first] <= column:
+                first += 1
+
+            if len(bucket) - first < self.scalar_rows:
+                for position in range(first, len(bucket)):
+                    symbols = list_of_symbols[bucket[position]][column:]
+                    state = int(current[position]) * width
+                    current[position] = self.run(symbols, state) // width
+                break
+
+            current[first:] = table[current[first:], inputs[first:, column]]
+
+        states[bucket] = current
+
+    def state_function(self, symbols: Iterable[str]) -> tuple[int, ...]:
+        """
+        Compute the transition function of the complete input 'symbols', i.e.
+        the state reached from every state. All states are run at once and
+        runs that reach the same state are merged. The dead state is
+        absorbing, so runs that reach it are dropped, and once the remaining
+        runs have all merged this costs no more than a single run.
+        returns: A tuple with at index i the code of the state reached from
+                 the state coded by i * width (including the dead state)
+        """
+        table = self.table
+        symbol_classes = self.symbol_classes
+        dead = self.dead
+        width = self.width
+
+        # Maps every live reached state to the states it was reached from,
+        # the runs that died are only remembered by their origin
+        current = {code: [code] for code in range(0, dead, width)}
+        symbols = iter(symbols)
+        for symbol in symbols:
+            if not current:
+                break
+
+            symbol_class = symbol_classes.get(symbol)
+            if symbol_class is None:
+                # Symbol not in Sigma, every run dies
+                current = {}
+                break
+
+            next_states = {}
+            for state, origins in current.items():
+                next_state = table[state + symbol_class]
+                if next_state == dead:
+                    continue
+                if next_state in next_states:
+                    next_states[next_state] += origins
+                else:
+                    next_states[next_state] = origins
+            current = next_states
+
+            if len(current) == 1:
+                # All live runs have merged, finish with a single run
+                (state, origins), = current.items()
+                current = {self.run(symbols, state): origins}
+                break
+
+        result = [dead] * (dead // width + 1)
+        for state, origins in current.items():
+            for code in origins:
+                result[code // width] = state
+
+        return tuple(result)
+
+    def run_parallel(self,
+                     symbols: Sequence[str],
+                     workers: int | None = None,
+                     chunk_size: int = 1 << 16) -> int:
+        """
+        Follow the transitions for all 'symbols' from the start state, using
+        'workers' processes (all cores by default). The input is split into
+        chunks of 'chunk_size' symbols, every worker computes the transition
+        function of a chunk (see state_function) and the functions are
+        composed in order, which is associative.
+        returns: The code of the reached state, like run
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1 or len(symbols) <= chunk_size:
+            return self.run(symbols)
+
+        chunks = [symbols[start:start + chunk_size]
+                  for start in range(0, len(symbols), chunk_size)]
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(self,)) as executor:
+            functions = list(executor.map(_worker_state_function, chunks))
+
+        state = self.start
+        for function in functions:
+            state = function[state // self.width]
+
+        return state
+
+    def accepts_parallel(self,
+                         symbols: Sequence[str],
+                         workers: int | None = None,
+                         chunk_size: int = 1 << 16) -> bool:
+        """
+        Check whether the complete input 'symbols' leads to a final state,
+        see run_parallel
+        """
+        return self.run_parallel(symbols, workers, chunk_size) in self.final
+
+    def is_final(self, state: int) -> bool:
+        """
+        Check whether the state coded by 'state' is a final state
+        """
+        return state in self.final
+
+    def state_name(self, state: int) -> str | None:
+        """
+        Name of the state coded by 'state', None for the dead state
+        """
+        if state == self.dead:
+            return None
+        return self.state_names[state // self.width]
+
+
+# The CompiledFA used by a worker process of CompiledFA.run_parallel
+_worker_fa = None
+
+
+def _init_worker(compiled_fa: CompiledFA) -> None:
+    global _worker_fa
+    _worker_fa = compiled_fa
+
+
+def _worker_state_function(symbols: Sequence[str]) -> tuple[int, ...]:
+    return _worker_fa.state_function(symbols)
+
 
 class State:
     """State in a Finite Automaton (FA)"""
@@ -141,3 +616,601 @@ class State:
         """
         self.name = name
         self.transition_table = transition_table
+
+
+class NFA:
+    """
+    Nondeterministic Finite Automaton (NFA) with ϵ-transitions
+
+    The NFA is determinized lazily: DFA states (ϵ-closed sets of NFA states)
+    and their transitions are only created when a run needs them, and are kept
+    in a cache of at most 'cache_size' DFA states, evicting the least recently
+    used one. Runs therefore cost one cache lookup per symbol once the cache
+    is warm, while patterns that blow up under full determinization only ever
+    hold a bounded number of DFA states.
+    """
+
+    def __init__(self,
+                 Q: list[str] | set[str],
+                 Sigma: list[str] | set[str],
+                 delta: dict[str, dict[str, list[str] | set[str]]],
+                 s: str,
+                 F: list[str] | set[str],
+                 verbose: bool = False,
+                 cache_size: int = 1024):
+        """
+        Creates the NFA object and performs input sanitization
+
+        Q:          The finite set of states
+
+        Sigma:      The input alphabet
+
+        delta:      The transition relation, a dictionary with elements in the
+                    form: state: {[symbol: [next_state*]]*}, where state ∈ Q,
+                    symbol ∈ Sigma or symbol = 'ϵ' and next_state ∈ Q.
+
+        s:          The start state
+
+        F:          The finite set of final states
+
+        verbose:    Indicator specifying whether a warning should be printed if
+                    the NFA attempts a non-existent transition
+
+        cache_size: The maximum number of DFA states kept in the cache
+        """
+
+        # Verify proper use of states
+        if len(Q) != len(set(Q)):
+            raise StateError("Q contains duplicates")
+
+        if s not in Q:
+            raise StateError(f"Starting state '{s}' not in Q: {Q}")
+
+        for state in F:
+            if state not in Q:
+                raise StateError(f"Final state '{state}' not in Q: {Q}")
+
+        # Verify proper use of transitions
+        for state in delta:
+            if state not in Q:
+                raise TransitionError(f"State '{state}' not in Q: {Q}")
+
+            for symbol, next_states in delta[state].items():
+                if symbol not in Sigma and symbol != 'ϵ':
+                    raise TransitionError(f"Symbol '{symbol}' for state "
+                                          f"'{state}' not in Sigma: {Sigma}")
+                for next_state in next_states:
+                    if next_state not in Q:
+                        raise TransitionError(
+                            f"State '{next_state}' for symbol '{symbol}' and "
+                            f"state '{state}' not in Q: {Q}")
+
+        if cache_size < 1:
+            raise FAError("The cache should hold at least one DFA state")
+
+        # Code the states as integers
+        self.state_names = list(Q)
+        index = {name: code for code, name in enumerate(self.state_names)}
+        self.transitions = []
+        self.epsilon = []
+        for name in self.state_names:
+            transitions = {}
+            for symbol, next_states in delta.get(name, {}).items():
+                transitions[symbol] = tuple(index[next_state]
+                                            for next_state in next_states)
+            self.epsilon.append(transitions.pop('ϵ', ()))
+            self.transitions.append(transitions)
+
+        # Retain and assign variables
+        self.verbose = verbose
+        self.input_alphabet = Sigma
+        self.final_codes = frozenset(index[state] for state in F)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.start_state = self.closure([index[s]])
+        self.current_state = self.start_state
+
+    @classmethod
+    def from_regex(cls,
+                   pattern: str,
+                   Sigma: list[str] | set[str] | None = None,
+                   verbose: bool = False,
+                   cache_size: int = 1024) -> 'NFA':
+        """
+        Creates an NFA accepting the language of the regular expression
+        'pattern' (see parse_regex) using Thompson's construction.
+
+        Sigma: The input alphabet, the symbols in 'pattern' by default
+
+        Example, the step verification automaton of PO1:
+        >>> NFA.from_regex('(READ (SYMBOL | LEM | BLANK) WRITE '
+                           '(SYMBOL | LEM | BLANK) (MLEFT | MRIGHT))*')
+        """
+        tree = parse_regex(pattern)
+        if Sigma is None:
+            Sigma = sorted(regex_symbols(tree))
+
+        delta = {}
+
+        def add(state: str, symbol: str, next_state: str) -> None:
+            delta.setdefault(state, {}).setdefault(symbol, []).append(
+                next_state)
+
+        def build(node: tuple) -> tuple[str, str]:
+            # Returns the start and the (single) final state of the fragment
+            start = f'q{len(Q)}'
+            end = f'q{len(Q) + 1}'
+            Q.extend([start, end])
+
+            kind = node[0]
+            if kind == 'symbol':
+                add(start, node[1], end)
+            elif kind == 'empty':
+                add(start, 'ϵ', end)
+            elif kind == 'concat':
+                previous = start
+                for child in node[1]:
+                    child_start, child_end = build(child)
+                    add(previous, 'ϵ', child_start)
+                    previous = child_end
+                add(previous, 'ϵ', end)
+            elif kind == 'union':
+                for child in node[1]:
+                    child_start, child_end = build(child)
+                    add(start, 'ϵ', child_start)
+                    add(child_end, 'ϵ', end)
+            else:
+                child_start, child_end = build(node[1])
+                add(start, 'ϵ', child_start)
+                add(child_end, 'ϵ', end)
+                if kind in ('star', 'optional'):
+                    add(start, 'ϵ', end)
+                if kind in ('star', 'plus'):
+                    add(child_end, 'ϵ', child_start)
+
+            return start, end
+
+        Q = []
+        s, f = build(tree)
+
+        return cls(Q, Sigma, delta, s, [f], verbose, cache_size)
+
+    def closure(self, codes: Iterable[int]) -> frozenset[int]:
+        """
+        The ϵ-closure of the NFA states coded by 'codes'
+        """
+        result = set(codes)
+        stack = list(result)
+        while stack:
+            for next_code in self.epsilon[stack.pop()]:
+                if next_code not in result:
+                    result.add(next_code)
+                    stack.append(next_code)
+
+        return frozenset(result)
+
+    def next_state(self, state: frozenset[int], symbol: str) -> frozenset[int]:
+        """
+        Follow the transition 'symbol' from the DFA state 'state', creating
+        the transition (and the DFA state) if it is not cached yet
+        returns: The next DFA state, the empty set if there is none
+        """
+        cache = self.cache
+        row = cache.get(state)
+        if row is None:
+            row = cache[state] = {}
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(state)
+
+        next_state = row.get(symbol)
+        if next_state is None:
+            transitions = self.transitions
+            next_state = row[symbol] = self.closure(
+                next_code for code in state
+                for next_code in transitions[code].get(symbol, ()))
+
+        return next_state
+
+    def transition(self, symbol: str) -> bool:
+        """
+        Try to follow the transition 'symbol' from the current state
+        returns: True if succeeded, False otherwise
+        """
+        next_state = self.next_state(self.current_state, symbol)
+        if next_state:
+            self.current_state = next_state
+            return True
+
+        if self.verbose:
+            print(f"Warning: States {self.current_names()} have no "
+                  f"transition for symbol '{symbol}', transition could "
+                  "not be performed", file=sys.stderr)
+        return False
+
+    def run(self, symbols: Iterable[str]) -> frozenset[int]:
+        """
+        Follow the transitions for all 'symbols' from the start state
+        returns: The reached DFA state, the empty set as soon as no NFA state
+                 is left
+        """
+        next_state = self.next_state
+        state = self.start_state
+        for symbol in symbols:
+            state = next_state(state, symbol)
+            if not state:
+                break
+
+        return state
+
+    def accepts(self, symbols: Iterable[str]) -> bool:
+        """
+        Check whether the complete input 'symbols' is accepted
+        """
+        return not self.final_codes.isdisjoint(self.run(symbols))
+
+    def current_names(self) -> list[str]:
+        """
+        Names of the NFA states in the current state
+        """
+        return [self.state_names[code] for code in sorted(self.current_state)]
+
+    def is_final(self) -> bool:
+        """
+        Check whether the current state contains a final state
+        """
+        return not self.final_codes.isdisjoint(self.current_state)
+
+    def reset(self) -> None:
+        self.current_state = self.start_state
+
+
+class BitParallelNFA:
+    """
+    Bit-parallel simulation of the Glushkov NFA of a regular expression
+
+    The Glushkov NFA has one state per symbol occurrence (position) in the
+    pattern, numbered from left to right, plus an initial state 0. The set of
+    active states is a single int with bit p set for active position p, and
+    entering position p always means reading the symbol at p, so a step is:
+
+        state = follow(state) & masks[symbol]
+
+    Follow edges p -> q are grouped by their distance q - p. The most common
+    distances (e.g. 1 for concatenation, small ones for unions) are each
+    handled for all positions at once by a masked shift, only the remaining
+    edges are looked up per active position. No DFA is ever built, runs take
+    linear time with a few bitwise operations per symbol.
+    """
+
+    # The maximum number of distances handled by a masked shift
+    max_shifts = 8
+
+    def __init__(self, pattern: str, verbose: bool = False):
+        """
+        pattern: The regular expression, see parse_regex
+
+        verbose: Indicator specifying whether a warning should be printed if
+                 a transition leaves no active states
+        """
+        masks = {}
+        follow = [0]
+
+        def build(node: tuple) -> tuple[bool, int, int]:
+            # Returns nullable, first and last of the subexpression
+            kind = node[0]
+            if kind == 'symbol':
+                bit = 1 << len(follow)
+                follow.append(0)
+                masks[node[1]] = masks.get(node[1], 0) | bit
+                return False, bit, bit
+
+            if kind == 'empty':
+                return True, 0, 0
+
+            if kind == 'concat':
+                nullable, first, last = True, 0, 0
+                for child in node[1]:
+                    child_nullable, child_first, child_last = build(child)
+                    add_follow(last, child_first)
+                    if nullable:
+                        first |= child_first
+                    last = child_last | (last if child_nullable else 0)
+                    nullable = nullable and child_nullable
+                return nullable, first, last
+
+            if kind == 'union':
+                nullable, first, last = False, 0, 0
+                for child in node[1]:
+                    child_nullable, child_first, child_last = build(child)
+                    nullable = nullable or child_nullable
+                    first |= child_first
+                    last |= child_last
+                return nullable, first, last
+
+            nullable, first, last = build(node[1])
+            if kind in ('star', 'plus'):
+                add_follow(last, first)
+            return nullable or kind != 'plus', first, last
+
+        def add_follow(positions: int, next_positions: int) -> None:
+            while positions:
+                low = positions & -positions
+                follow[low.bit_length() - 1] |= next_positions
+                positions ^= low
+
+        nullable, first, last = build(parse_regex(pattern))
+        follow[0] = first
+
+        # Group the follow edges by distance, and handle the most common
+        # distances with masked shifts
+        distances = {}
+        for position, next_positions in enumerate(follow):
+            while next_positions:
+                low = next_positions & -next_positions
+                distance = low.bit_length() - 1 - position
+                distances[distance] = \
+                    distances.get(distance, 0) | (1 << position)
+                next_positions ^= low
+
+        shifted = sorted(distances,
+                         key=lambda distance: -distances[distance].bit_count())
+        shifts = [(distance, distances[distance])
+                  for distance in shifted[:self.max_shifts]
+                  if distances[distance].bit_count() > 1]
+
+        extras = {}
+        for position, next_positions in enumerate(follow):
+            for distance, mask in shifts:
+                if mask >> position & 1:
+                    next_positions &= ~(1 << (position + distance))
+            if next_positions:
+                extras[position] = next_positions
+
+        # Retain and assign variables
+        self.verbose = verbose
+        self.input_alphabet = sorted(masks)
+        self.positions = len(follow) - 1
+        self.masks = masks
+        self.shifts = shifts
+        self.special = sum(1 << position for position in extras)
+        self.extras = extras
+        self.final = last | (1 if nullable else 0)
+        self.start_state = 1
+        self.current_state = self.start_state
+        self._extra_cache = {}
+
+    def _extra(self, state: int) -> int:
+        """
+        Union of the follow edges not handled by a shift, for the special
+        positions in 'state', cached in a bounded cache
+        """
+        result = self._extra_cache.get(state)
+        if result is None:
+            result = 0
+            extras = self.extras
+            positions = state
+            while positions:
+                low = positions & -positions
+                result |= extras[low.bit_length() - 1]
+                positions ^= low
+            if len(self._extra_cache) >= 4096:
+                self._extra_cache.clear()
+            self._extra_cache[state] = result
+
+        return result
+
+    def step(self, state: int, symbol: str) -> int:
+        """
+        Follow the transition 'symbol' from the set of active positions 'state'
+        returns: The next set of active positions
+        """
+        reach = 0
+        for distance, mask in self.shifts:
+            if distance > 0:
+                reach |= (state & mask) << distance
+            else:
+                reach |= (state & mask) >> -distance
+        if state & self.special:
+            reach |= self._extra(state & self.special)
+        return reach & self.masks.get(symbol, 0)
+
+    def run(self, symbols: Iterable[str]) -> int:
+        """
+        Follow the transitions for all 'symbols' from the start state
+        returns: The reached set of active positions, 0 as soon as no position
+                 is active
+        """
+        masks = self.masks
+        forward = [shift for shift in self.shifts if shift[0] > 0]
+        backward = [(-distance, mask) for distance, mask in self.shifts
+                    if distance <= 0]
+        special = self.special
+        extra = self._extra
+
+        state = self.start_state
+        for symbol in symbols:
+            reach = 0
+            for distance, mask in forward:
+                reach |= (state & mask) << distance
+            for distance, mask in backward:
+                reach |= (state & mask) >> distance
+            if state & special:
+                reach |= extra(state & special)
+            state = reach & masks.get(symbol, 0)
+            if not state:
+                break
+
+        return state
+
+    def accepts(self, symbols: Iterable[str]) -> bool:
+        """
+        Check whether the complete input 'symbols' matches the pattern
+        """
+        return bool(self.run(symbols) & self.final)
+
+    def search(self, symbols: Iterable[str]) -> Iterable[int]:
+        """
+        Scan 'symbols' for matches of the pattern starting anywhere
+        returns: A generator yielding the index of the last symbol of every
+                 non-empty match, in increasing order
+        """
+        masks = self.masks
+        forward = [shift for shift in self.shifts if shift[0] > 0]
+        backward = [(-distance, mask) for distance, mask in self.shifts
+                    if distance <= 0]
+        special = self.special
+        extra = self._extra
+        final = self.final & ~1
+
+        state = 0
+        for index, symbol in enumerate(symbols):
+            # A new match may start at every symbol
+            state |= 1
+            reach = 0
+            for distance, mask in forward:
+                reach |= (state & mask) << distance
+            for distance, mask in backward:
+                reach |= (state & mask) >> distance
+            if state & special:
+                reach |= extra(state & special)
+            state = reach & masks.get(symbol, 0)
+            if state & final:
+                yield index
+
+    def transition(self, symbol: str) -> bool:
+        """
+        Try to follow the transition 'symbol' from the current state
+        returns: True if succeeded, False otherwise
+        """
+        next_state = self.step(self.current_state, symbol)
+        if next_state:
+            self.current_state = next_state
+            return True
+
+        if self.verbose:
+            print(f"Warning: No position has a transition for symbol "
+                  f"'{symbol}', transition could not be performed",
+                  file=sys.stderr)
+        return False
+
+    def is_final(self) -> bool:
+        """
+        Check whether the current state contains a final position
+        """
+        return bool(self.current_state & self.final)
+
+    def reset(self) -> None:
+        self.current_state = self.start_state
+
+
+def parse_regex(pattern: str) -> tuple:
+    """
+    Parses the regular expression 'pattern' into a syntax tree
+
+    Symbols are either names (runs of letters, digits and underscores, e.g.
+    'READ') or any other single character. Whitespace only separates symbols.
+    The operators are, in order of precedence, '*', '+' and '?' (postfix),
+    concatenation and '|', and parentheses group. 'ϵ' denotes the empty string
+    and a backslash turns the next character into a symbol.
+
+    returns: A tree of tuples: ('symbol', symbol), ('empty',),
+             ('concat', [tree*]), ('union', [tree*]), ('star', tree),
+             ('plus', tree) or ('optional', tree)
+    """
+
+    # Tokenize
+    tokens = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char.isspace():
+            index += 1
+        elif char == '\\':
+            if index + 1 == len(pattern):
+                raise RegexError(f"Pattern '{pattern}' ends with an escape")
+            tokens.append(('symbol', pattern[index + 1]))
+            index += 2
+        elif char in '|*+?()':
+            tokens.append((char, char))
+            index += 1
+        elif char == 'ϵ':
+            tokens.append(('empty', char))
+            index += 1
+        elif char.isalnum() or char == '_':
+            end = index
+            while end < len(pattern) and \
+                    (pattern[end].isalnum() or pattern[end] == '_'):
+                end += 1
+            tokens.append(('symbol', pattern[index:end]))
+            index = end
+        else:
+            tokens.append(('symbol', char))
+            index += 1
+
+    position = 0
+
+    def peek() -> str | None:
+        return tokens[position][0] if position < len(tokens) else None
+
+    def parse_union() -> tuple:
+        nonlocal position
+        children = [parse_concat()]
+        while peek() == '|':
+            position += 1
+            children.append(parse_concat())
+        return children[0] if len(children) == 1 else ('union', children)
+
+    def parse_concat() -> tuple:
+        children = []
+        while peek() not in ('|', ')', None):
+            children.append(parse_repeat())
+        if not children:
+            return ('empty',)
+        return children[0] if len(children) == 1 else ('concat', children)
+
+    def parse_repeat() -> tuple:
+        nonlocal position
+        node = parse_atom()
+        operators = {'*': 'star', '+': 'plus', '?': 'optional'}
+        while peek() in operators:
+            node = (operators[peek()], node)
+            position += 1
+        return node
+
+    def parse_atom() -> tuple:
+        nonlocal position
+        kind, value = tokens[position]
+        position += 1
+        if kind == 'symbol':
+            return ('symbol', value)
+        if kind == 'empty':
+            return ('empty',)
+        if kind == '(':
+            node = parse_union()
+            if peek() != ')':
+                raise RegexError(f"Missing ')' in pattern '{pattern}'")
+            position += 1
+            return node
+        raise RegexError(f"Unexpected '{value}' in pattern '{pattern}'")
+
+    tree = parse_union()
+    if position != len(tokens):
+        raise RegexError(f"Unexpected '{tokens[position][1]}' in pattern "
+                         f"'{pattern}'")
+
+    return tree
+
+
+def regex_symbols(tree: tuple) -> set[str]:
+    """
+    The set of symbols used in the regular expression syntax tree 'tree'
+    """
+    if tree[0] == 'symbol':
+        return {tree[1]}
+    if tree[0] == 'empty':
+        return set()
+    if tree[0] in ('concat', 'union'):
+        return set().union(*map(regex_symbols, tree[1]))
+    return regex_symbols(tree[1])
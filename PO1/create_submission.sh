@@ -12,5 +12,5 @@ else
     TAR="tar"
 fi
 
-echo "$TAR --create --gz --verbose --file PO1.tar.gz --transform \"s,^,PO1/,\" FA.py lexer.py traces.txt verify.py"
-$TAR --create --gz --verbose --file PO1.tar.gz --transform "s,^,PO1/," FA.py lexer.py traces.txt verify.py
+echo "$TAR --create --gz --verbose --file PO1.tar.gz --transform \"s,^,PO1/,\" FA.py lexer.py memo.py traces.txt verify.py"
+$TAR --create --gz --verbose --file PO1.tar.gz --transform "s,^,PO1/," FA.py lexer.py memo.py traces.txt verify.py
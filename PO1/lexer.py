@@ -15,10 +15,23 @@ if sys.version_info < (3, 10):
     print("FA.py requires Python 3.10 or newer. Cannot continue...")
     sys.exit(1)
 
-from FA import FA, FAError
+from FA import FA, CompiledFA, FAError
+from array import array
+from collections.abc import Iterable, Iterator
+from contextlib import nullcontext
+from functools import lru_cache
 from pathlib import Path
+from typing import TextIO
+import mmap
+import re
 import string
 
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is only needed for numpy_lexer
+    np = None
+
 
 def create_fa(verbose: bool = False) -> FA:
     """
@@ -60,6 +73,24 @@ def char_type(char: str) -> str:
         return char
 
 
+@lru_cache(maxsize=16)
+def char_classes(fa: CompiledFA) -> dict[str, int]:
+    """
+    Maps every character the lexer accepts to its symbol class in the compiled
+    lexer FA 'fa', i.e. fa.symbol_classes[char_type(char)]
+    The result is cached per compiled FA and should not be modified.
+    """
+    classes = {}
+    for char in string.digits + string.ascii_letters:
+        if char_type(char) in fa.symbol_classes:
+            classes[char] = fa.symbol_classes[char_type(char)]
+    for symbol, symbol_class in fa.symbol_classes.items():
+        if len(symbol) == 1 and char_type(symbol) == symbol:
+            classes[symbol] = symbol_class
+
+    return classes
+
+
 def lexer(fa: FA, trace: str) -> list[tuple[str, str]]:
     """
     The lexer iterates through the trace, tokenizing and assigning states to it
@@ -159,21 +190,498 @@ def lexer(fa: FA, trace: str) -> list[tuple[str, str]]:
     return ans
 
 
-def main(file: Path, verbose: bool = False) -> None:
+def lex_spans(fa: FA | CompiledFA,
+              trace: str,
+              packed: bool = False) -> list[tuple[int, int, int]] | array:
     """
-    Reads multiple traces from the file at 'file' and feeds them one by one to
-    the lexer.
+    Tokenizes 'trace' like lexer, but without creating the token strings.
+    Every token is a span (start, end, kind) over 'trace', where
+    trace[start:end] is the token and kind the index of its state in
+    list(fa.states) (or fa.state_names for a compiled FA). See span_tokens to
+    create the tokens.
+    fa: The finite automaton, or its compiled form (compiled once)
+    trace: A single string
+    packed: Return the spans packed into one flat array('I') of
+            start, end, kind triples, instead of a list of tuples
+    returns: The spans of all tokens.
+    Errors raise an FAError exception, like lexer.
     """
-    M = create_fa(verbose)
+    if isinstance(fa, FA):
+        fa = fa.compile()
+    classes = char_classes(fa)
+    table = fa.table
+    start = fa.start
+    dead = fa.dead
+    final = fa.final
+    width = fa.width
+
+    spans = array('I') if packed else []
+    add = spans.extend if packed else spans.append
+    state = start
+    token_start = 0
+    for index, char in enumerate(trace):
+        try:
+            next_state = table[state + classes[char]]
+        except KeyError:
+            raise FAError(char + " is not in alphabet.") from None
+
+        if next_state == dead:
+            # The current token is complete, start a new one
+            if state not in final:
+                raise FAError("The token " + trace[token_start:index] +
+                              " is unacceptable for this FA")
+            add((token_start, index, state // width))
+            token_start = index
+            next_state = table[start + classes[char]]
+            if next_state == dead:
+                raise FAError(
+                    "The input " + char + " is unacceptable for start state.")
+
+        state = next_state
+
+    if state not in final:
+        raise FAError("The token " + trace[token_start:] +
+                      " is unacceptable for this FA")
+    add((token_start, len(trace), state // width))
+
+    return spans
+
+
+def span_tokens(fa: FA | CompiledFA,
+                trace: str,
+                spans: list[tuple[int, int, int]] | array
+                ) -> Iterator[tuple[str, str]]:
+    """
+    Creates the tokens of the spans produced by lex_spans, on demand
+    returns: A generator yielding the same (token, state) tuples as lexer
+    """
+    names = fa.state_names if isinstance(fa, CompiledFA) else list(fa.states)
+    if isinstance(spans, array):
+        spans = zip(spans[0::3], spans[1::3], spans[2::3])
+
+    for start, end, kind in spans:
+        yield trace[start:end], names[kind]
+
+
+def numpy_lexer(fa: FA | CompiledFA, trace: str) -> list[tuple[str, str]]:
+    """
+    Tokenizes 'trace' like lexer, classifying all characters at once with
+    NumPy. The codepoints of the trace are mapped to symbol classes by a
+    lookup table, and token boundaries are found with vectorized masks:
+    a character continues the current token only if the state of the token
+    has a transition to itself on the class of the character (maximal munch,
+    only SYMBOL tokens span several characters in the lexer FA).
+
+    This requires every token to be recognized by the state reached from
+    the start state on its first character, i.e. all transitions of the
+    other states are transitions to themselves, and a state only has such a
+    transition on a class if the start state moves to it on that class.
+    fa: The finite automaton, or its compiled form (compiled once)
+    trace: A single string
+    returns: The same list of (token, state) tuples as lexer.
+    Errors raise an FAError exception, like lexer.
+    """
+    if np is None:
+        raise FAError("NumPy is required for numpy_lexer")
+
+    if isinstance(fa, FA):
+        fa = fa.compile()
+    classes = char_classes(fa)
+    width = fa.width
+    states = len(fa.state_names) + 1
+    start = fa.start // width
+    dead = fa.dead // width
+
+    # Transition table with one row per state and one column per class
+    table = np.array(fa.table, dtype=np.intp).reshape(states, width) // width
+    first = table[start]
+    loops = table == np.arange(states)[:, None]
+    loops[dead] = False
+
+    for state in range(states):
+        if state != start and state != dead and \
+                np.any((table[state] != dead) & ~loops[state]):
+            raise FAError("numpy_lexer requires all transitions, except "
+                          "those of the start state, to be self-loops")
+        if np.any(loops[state] & (first != state)):
+            raise FAError("numpy_lexer requires every self-loop on a class "
+                          "to be entered from the start state on that class")
+
+    if not trace:
+        raise FAError("The token  is unacceptable for this FA")
+
+    # Classify all characters, the extra class 'width' marks invalid ones
+    lookup = np.full(max(map(ord, classes)) + 1, width, dtype=np.intp)
+    for char, symbol_class in classes.items():
+        lookup[ord(char)] = symbol_class
+    codepoints = np.frombuffer(trace.encode('utf-32-le'), dtype=np.uint32)
+    char_class = np.where(codepoints < len(lookup),
+                          lookup[np.minimum(codepoints, len(lookup) - 1)],
+                          width)
+
+    invalid = np.flatnonzero(char_class == width)
+    if len(invalid):
+        raise FAError(trace[invalid[0]] + " is not in alphabet.")
+
+    # The state of the token every character belongs to
+    kind = first[char_class]
+    starts_token = np.ones(len(trace), dtype=bool)
+    starts_token[1:] = ~loops[kind[:-1], char_class[1:]]
+
+    unacceptable = np.flatnonzero(starts_token & (kind == dead))
+    if len(unacceptable):
+        raise FAError("The input " + trace[unacceptable[0]] +
+                      " is unacceptable for start state.")
+
+    starts = np.flatnonzero(starts_token)
+    ends = np.append(starts[1:], len(trace))
+    kinds = kind[starts]
+
+    final = np.zeros(states, dtype=bool)
+    final[[state // width for state in fa.final]] = True
+    not_final = np.flatnonzero(~final[kinds])
+    if len(not_final):
+        token = not_final[0]
+        raise FAError("The token " + trace[starts[token]:ends[token]] +
+                      " is unacceptable for this FA")
+
+    names = fa.state_names
+    return [(trace[start:end], names[kind])
+            for start, end, kind in zip(starts.tolist(), ends.tolist(),
+                                        kinds.tolist())]
+
+
+@lru_cache(maxsize=16)
+def token_regex(fa: CompiledFA) -> tuple[re.Pattern, dict[str, str]]:
+    """
+    Derives a single regular expression for the tokens of the compiled lexer
+    FA 'fa'. Every final state reached from the start state becomes one
+    alternative, matching the characters leading to it followed by the
+    characters it loops on, e.g. [0-9A-Za-z][0-9A-Za-z]* for SYMBOL. This
+    requires the states reached from the start state to have no transitions
+    to other states. The result is cached per compiled FA.
+    returns: The compiled expression and the name of the state of a token,
+             given its first character
+    """
+    classes = char_classes(fa)
+    table = fa.table
+
+    first_chars = {}
+    for char, symbol_class in sorted(classes.items()):
+        state = table[fa.start + symbol_class]
+        if state != fa.dead:
+            first_chars.setdefault(state, []).append(char)
+
+    alternatives = []
+    kinds = {}
+    for state, chars in first_chars.items():
+        loop_chars = []
+        for char, symbol_class in sorted(classes.items()):
+            next_state = table[state + symbol_class]
+            if next_state == state:
+                loop_chars.append(char)
+            elif next_state != fa.dead:
+                raise FAError("token_regex requires all transitions, except "
+                              "those of the start state, to be self-loops")
+
+        # Tokens ending in other states are lexer errors
+        if state not in fa.final:
+            continue
+
+        alternative = "[" + "".join(map(re.escape, chars)) + "]"
+        if loop_chars:
+            alternative += "[" + "".join(map(re.escape, loop_chars)) + "]*"
+        alternatives.append(alternative)
+        for char in chars:
+            kinds[char] = fa.state_name(state)
+
+    return re.compile("|".join(alternatives)), kinds
+
+
+def fast_lexer(fa: FA | CompiledFA, trace: str) -> list[tuple[str, str]]:
+    """
+    Tokenizes 'trace' like lexer, using the regular expression derived from
+    the FA by token_regex, so all matching happens in the regex engine. The
+    FA based lexer remains the reference definition, see check.
+    fa: The finite automaton, or its compiled form (compiled once)
+    trace: A single string
+    returns: The same list of (token, state) tuples as lexer.
+    Errors raise an FAError exception, like lexer.
+    """
+    if isinstance(fa, FA):
+        fa = fa.compile()
+    pattern, kinds = token_regex(fa)
+
+    # The matches are consecutive if and only if they cover the whole trace
+    tokens = pattern.findall(trace)
+    if sum(map(len, tokens)) != len(trace) or not trace:
+        # Let the table-driven lexer raise the same error as lexer
+        lex_spans(fa, trace)
+        raise FAError(f"The trace cannot be lexed: \"{trace}\"")
 
-    with file.open(encoding='utf-8') as f:
-        traces = [line.rstrip('\n') for line in f]
+    return [(token, kinds[token[0]]) for token in tokens]
+
+
+def check(traces: Iterable[str], fa: FA | None = None) -> int:
+    """
+    Runs both lexer and fast_lexer on every trace in 'traces', and prints
+    every trace on which they diverge (including the errors they raise)
+    fa: The finite automaton, see create_fa (used by default)
+    returns: The number of diverging traces
+    """
+    if fa is None:
+        fa = create_fa()
+    compiled = fa.compile()
 
+    divergences = 0
     for trace in traces:
-        M.reset()
-        print(f"Trace : \"{trace}\"")
-        lexed_trace = lexer(M, trace)
-        print(f"Lexer : {lexed_trace}")
+        results = []
+        for function, automaton in ((lexer, fa), (fast_lexer, compiled)):
+            try:
+                results.append(function(automaton, trace))
+            except FAError as error:
+                results.append(f"FAError: {error}")
+
+        if results[0] != results[1]:
+            divergences += 1
+            print(f"Trace : \"{trace}\"")
+            print(f"Lexer : {results[0]}")
+            print(f"Fast  : {results[1]}")
+
+    return divergences
+
+
+def iter_tokens(stream: TextIO,
+                fa: FA | None = None,
+                chunk_size: int = 1 << 16) -> Iterator[tuple[str, str] | None]:
+    """
+    Tokenizes the traces in 'stream' (one trace per line, like main) without
+    reading the stream as a whole. The stream is read in chunks of at most
+    'chunk_size' characters, and the state of the FA is kept across chunk
+    boundaries, so memory stays bounded by the chunk and the longest token.
+    fa: The finite automaton, see create_fa (used by default)
+    stream: A text file object, e.g. an open file or sys.stdin
+    returns: A generator yielding the (token, state) tuples of every trace as
+    soon as they are complete, followed by None at the end of every trace.
+    Errors raise an FAError exception, like lexer.
+    """
+    if fa is None:
+        fa = create_fa()
+    compiled = fa.compile()
+    classes = char_classes(compiled)
+    table = compiled.table
+    start = compiled.start
+    dead = compiled.dead
+    final = compiled.final
+
+    state = start
+    in_trace = False
+    # Text of the current token in earlier chunks
+    pending = ""
+    while chunk := stream.readline(chunk_size):
+        token_start = 0
+        for index, char in enumerate(chunk):
+            if char == '\n':
+                token = pending + chunk[token_start:index]
+                if state not in final:
+                    raise FAError(
+                        "The token " + token + " is unacceptable for this FA")
+                yield token, compiled.state_name(state)
+                yield None
+                state = start
+                in_trace = False
+                pending = ""
+                token_start = index + 1
+                continue
+
+            in_trace = True
+            try:
+                next_state = table[state + classes[char]]
+            except KeyError:
+                raise FAError(char + " is not in alphabet.") from None
+
+            if next_state == dead:
+                # The current token is complete, start a new one
+                token = pending + chunk[token_start:index]
+                if state not in final:
+                    raise FAError(
+                        "The token " + token + " is unacceptable for this FA")
+                yield token, compiled.state_name(state)
+                pending = ""
+                token_start = index
+                next_state = table[start + classes[char]]
+                if next_state == dead:
+                    raise FAError(
+                        "The input " + char + " is unacceptable for start "
+                        "state.")
+
+            state = next_state
+
+        pending += chunk[token_start:]
+
+    # The last trace need not end with a newline
+    if in_trace:
+        if state not in final:
+            raise FAError(
+                "The token " + pending + " is unacceptable for this FA")
+        yield pending, compiled.state_name(state)
+        yield None
+
+
+def mmap_lexer(file: Path,
+               fa: FA | None = None) -> Iterator[list[tuple[str, str]]]:
+    """
+    Tokenizes the traces in the UTF-8 encoded file at 'file' (one trace per
+    line, like main) by memory-mapping the file and classifying raw bytes,
+    without decoding the file. ASCII bytes are classified through a table of
+    256 entries, multi-byte characters like '⊢' and '⊔' are matched as byte
+    sequences. Only the text of the tokens is decoded.
+    fa: The finite automaton, see create_fa (used by default)
+    returns: A generator yielding, for every trace, the same list as lexer.
+    Errors raise an FAError exception, like lexer.
+    """
+    if fa is None:
+        fa = create_fa()
+    compiled = fa.compile()
+    table = compiled.table
+    start = compiled.start
+    dead = compiled.dead
+    final = compiled.final
+    state_name = compiled.state_name
+
+    # Class of every byte: a symbol class, or one of the markers below
+    invalid = -1
+    multibyte = -2
+    byte_classes = [invalid] * 256
+    sequences = {}
+    for char, symbol_class in char_classes(compiled).items():
+        encoded = char.encode('utf-8')
+        if len(encoded) == 1:
+            byte_classes[encoded[0]] = symbol_class
+        else:
+            byte_classes[encoded[0]] = multibyte
+            sequences.setdefault(encoded[0], []).append(
+                (encoded, symbol_class))
+
+    with file.open('rb') as f:
+        if not f.seek(0, 2):
+            # Empty files cannot be mapped
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # Lines end in '\n', '\r\n' or '\r', as in text mode
+            position = 0
+            next_newline = next_return = -1
+            while position < len(data):
+                if next_newline < position:
+                    next_newline = data.find(b'\n', position)
+                    if next_newline == -1:
+                        next_newline = len(data)
+                if next_return < position:
+                    next_return = data.find(b'\r', position)
+                    if next_return == -1:
+                        next_return = len(data)
+                end = min(next_newline, next_return)
+
+                lexed_trace = []
+                state = start
+                token_start = index = position
+                while index < end:
+                    width = 1
+                    symbol_class = byte_classes[data[index]]
+                    if symbol_class == multibyte:
+                        for encoded, encoded_class in \
+                                sequences[data[index]]:
+                            if data[index:index + len(encoded)] == encoded:
+                                symbol_class = encoded_class
+                                width = len(encoded)
+                                break
+                        else:
+                            symbol_class = invalid
+                    if symbol_class == invalid:
+                        char = data[index:index + 4].decode('utf-8',
+                                                            'replace')[0]
+                        raise FAError(char + " is not in alphabet.")
+
+                    next_state = table[state + symbol_class]
+                    if next_state == dead:
+                        # The current token is complete, start a new one
+                        token = data[token_start:index].decode('utf-8')
+                        if state not in final:
+                            raise FAError("The token " + token +
+                                          " is unacceptable for this FA")
+                        lexed_trace.append((token, state_name(state)))
+                        token_start = index
+                        next_state = table[start + symbol_class]
+                        if next_state == dead:
+                            char = data[index:index + width].decode('utf-8')
+                            raise FAError("The input " + char + " is "
+                                          "unacceptable for start state.")
+
+                    state = next_state
+                    index += width
+
+                token = data[token_start:end].decode('utf-8')
+                if state not in final:
+                    raise FAError(
+                        "The token " + token + " is unacceptable for this FA")
+                lexed_trace.append((token, state_name(state)))
+
+                yield lexed_trace
+                position = end + 1
+                if data[end:end + 2] == b'\r\n':
+                    position += 1
+
+
+def main(file: Path,
+         verbose: bool = False,
+         stream: bool = False,
+         memory_map: bool = False,
+         sample: int | None = None) -> None:
+    """
+    Reads multiple traces from the file at 'file' (or stdin if 'file' is '-')
+    and feeds them one by one to the lexer.
+    If 'stream' is set, the tokens are printed as soon as they are read, see
+    iter_tokens. If 'memory_map' is set, the file is lexed by mmap_lexer,
+    which cannot read stdin.
+    If 'sample' is set, the first 'sample' traces (all if 0) are checked
+    against fast_lexer instead, see check.
+    """
+    M = create_fa(verbose)
+
+    if memory_map:
+        for lexed_trace in mmap_lexer(file, M):
+            # The lexemes make up the complete trace
+            trace = ''.join(lexeme for lexeme, _ in lexed_trace)
+            print(f"Trace : \"{trace}\"")
+            print(f"Lexer : {lexed_trace}")
+        return
+
+    if str(file) == '-':
+        context = nullcontext(sys.stdin)
+    else:
+        context = file.open(encoding='utf-8')
+
+    with context as f:
+        if sample is not None:
+            traces = (line.rstrip('\n') for line in f)
+            if sample:
+                traces = (trace for trace, _ in zip(traces, range(sample)))
+            divergences = check(traces, M)
+            print(f"Divergences: {divergences}")
+            return
+
+        if stream:
+            for token in iter_tokens(f, M):
+                print("" if token is None else f"Token : {token}")
+            return
+
+        for line in f:
+            trace = line.rstrip('\n')
+            M.reset()
+            print(f"Trace : \"{trace}\"")
+            lexed_trace = lexer(M, trace)
+            print(f"Lexer : {lexed_trace}")
 
 
 if __name__ == '__main__':
@@ -181,7 +689,20 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Tokenize a TM trace')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='enable verbose mode of FA')
+    parser.add_argument('-s', '--stream', action='store_true',
+                        help='print tokens as soon as they are read')
+    parser.add_argument('-m', '--mmap', action='store_true',
+                        help='lex the memory-mapped file as raw bytes (not '
+                             'for stdin)')
+    parser.add_argument('-c', '--check', action='store_true',
+                        help='compare the fast lexer with the lexer')
+    parser.add_argument('-n', '--sample', type=int, default=0,
+                        help='number of traces to check (default: all)')
     parser.add_argument('tracefile', type=Path,
-                        help='file containing traces to tokenize')
+                        help='file containing traces to tokenize, - for '
+                             'stdin')
     args = parser.parse_args()
-    main(args.tracefile, args.verbose)
+    if args.mmap and str(args.tracefile) == '-':
+        parser.error("-m/--mmap cannot memory-map stdin, give a file")
+    main(args.tracefile, args.verbose, args.stream, args.mmap,
+         args.sample if args.check else None)
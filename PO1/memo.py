@@ -0,0 +1,116 @@
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#  Framework for Automaten en Formele Talen             #
+#  Written by: Robin Visser & Tristan Laan              #
+#  based on work by: Bas van den Heuvel & Daan de Graaf #
+#                                                       #
+#  This work is licensed under a Creative Commons       #
+#  “Attribution-ShareAlike 4.0 International”  license. #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+import hashlib
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from typing import Any
+
+
+def trace_digest(trace: str | Iterable[str]) -> bytes:
+    """
+    Hash of the content of a trace, either a string or a list of tokens
+    """
+    if not isinstance(trace, str):
+        trace = '\0'.join(trace)
+    return hashlib.blake2b(trace.encode('utf-8'), digest_size=16).digest()
+
+
+_fingerprints = weakref.WeakKeyDictionary()
+
+
+def fingerprint(automaton: Any) -> str:
+    """
+    Identity of an automaton (FA, PDA or TM) based on its definition: two
+    automata with the same states, transitions, start state and final states
+    get the same fingerprint. The fingerprint is cached per automaton.
+    """
+    try:
+        return _fingerprints[automaton]
+    except KeyError:
+        pass
+
+    parts = [type(automaton).__name__,
+             getattr(automaton, 'pda_type', None),
+             automaton.start_state.name,
+             sorted(state.name
+                    for state in getattr(automaton, 'final_states', []))]
+    for name, state in automaton.states.items():
+        parts.append((name, sorted(map(repr,
+                                       state.transition_table.items()))))
+
+    result = hashlib.blake2b(repr(parts).encode('utf-8'),
+                             digest_size=16).hexdigest()
+    _fingerprints[automaton] = result
+
+    return result
+
+
+class TraceMemo:
+    """
+    Memoization of per-trace results (lexed traces, verdicts), keyed by the
+    automaton (or verification function) and the digest of the trace content,
+    see trace_digest. At most 'max_size' results are kept, evicting the least
+    recently used one.
+    """
+
+    def __init__(self, max_size: int = 1 << 16):
+        """
+        max_size: The maximum number of results kept
+        """
+        self.max_size = max_size
+        self.results = OrderedDict()
+        # Number of hits and misses per automaton
+        self.stats = {}
+
+    def get(self, automaton: str, digest: bytes, compute: Callable[[], Any]):
+        """
+        Look up the result of 'automaton' for the trace with digest 'digest',
+        calling 'compute' if it is not known yet
+        automaton: Identity of the automaton, e.g. its fingerprint
+        returns: The (memoized) result of compute()
+        """
+        key = (automaton, digest)
+        stats = self.stats.setdefault(automaton, [0, 0])
+        try:
+            result = self.results[key]
+        except KeyError:
+            stats[1] += 1
+            result = self.results[key] = compute()
+            if len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+            return result
+
+        stats[0] += 1
+        self.results.move_to_end(key)
+        return result
+
+    def hit_rate(self, automaton: str | None = None) -> float:
+        """
+        Fraction of lookups (for 'automaton', or all) that were hits
+        """
+        if automaton is None:
+            hits = sum(stats[0] for stats in self.stats.values())
+            misses = sum(stats[1] for stats in self.stats.values())
+        else:
+            hits, misses = self.stats.get(automaton, (0, 0))
+
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def report(self) -> str:
+        """
+        Summary of the hit rates per automaton
+        """
+        lines = []
+        for automaton, (hits, misses) in self.stats.items():
+            lines.append(f"{automaton}: {hits} hits, {misses} misses "
+                         f"({self.hit_rate(automaton):.1%} hit rate)")
+
+        return "\n".join(lines)
@@ -15,7 +15,10 @@ if sys.version_info < (3, 10):
     print("FA.py requires Python 3.10 or newer. Cannot continue...")
     sys.exit(1)
 
-from FA import FA
+from FA import CompiledFA, FA, FAError
+from array import array
+from functools import lru_cache
+from memo import TraceMemo, fingerprint, trace_digest
 from pathlib import Path
 import lexer as lexer
 
@@ -78,10 +81,176 @@ def verify_steps(fa: FA, lexed_trace: list[tuple[str, str]]) -> bool:
         return False
 
 
-def main(file: Path, verbose: bool = False) -> None:
+@lru_cache(maxsize=16)
+def compile_fa(fa: FA) -> CompiledFA:
+    """
+    Compiles the step verification FA 'fa', ignoring SPACE tokens
+    The result is cached per FA, so the FA should not be modified afterwards.
+    """
+    return fa.compile(ignore=['SPACE'])
+
+
+def verify_spans(fa: FA,
+                 spans: list[tuple[int, int, int]] | array,
+                 kinds: list[str]) -> bool:
+    """
+    Verifies a trace lexed into spans by lexer.lex_spans, equivalent to
+    verify_steps, without creating the tokens
+    fa: The finite automaton
+    spans: The spans of the tokens, as a list or a packed array
+    kinds: The names of the kinds, i.e. list(lexer_fa.states)
+    returns: True if the trace is valid, false otherwise.
+    """
+    if isinstance(spans, array):
+        kind_ids = spans[2::3]
+    else:
+        kind_ids = (kind for _, _, kind in spans)
+
+    return compile_fa(fa).accepts(kinds[kind] for kind in kind_ids)
+
+
+def verify_steps_batch(
+        fa: FA, lexed_traces: list[list[tuple[str, str]]]) -> list[bool]:
+    """
+    Verifies many lexed traces at once, equivalent to calling verify_steps on
+    every trace. Requires NumPy, see FA.run_batch.
+    fa: The finite automaton
+    lexed_traces: A list of lexed traces, as produced by the lexer
+    returns: For every trace, True if it is valid, False otherwise.
+    """
+    tokens = [[token for _, token in trace] for trace in lexed_traces]
+    return compile_fa(fa).run_batch(tokens).tolist()
+
+
+def verify_steps_parallel(fa: FA,
+                          lexed_trace: list[tuple[str, str]],
+                          workers: int | None = None) -> bool:
+    """
+    Verifies a single (very long) lexed trace using multiple processes,
+    equivalent to verify_steps, see CompiledFA.run_parallel
+    fa: The finite automaton
+    lexed_trace: A list of tuples of the form (event, token).
+    workers: The number of processes, all cores by default
+    returns: True if the trace is valid, false otherwise.
+    """
+    tokens = [token for _, token in lexed_trace]
+    return compile_fa(fa).accepts_parallel(tokens, workers)
+
+
+class FusedVerifier:
+    """
+    Product of the lexer FA and the step verification FA, verifying raw traces
+    in a single pass without building the list of tokens.
+
+    A product state is a pair (lexer state, verification state). Whenever the
+    lexer FA completes a token (it has no transition for the next character,
+    but is in a final state), the token is fed to the verification FA, where
+    SPACE tokens are ignored, and the lexer FA restarts. All reachable pairs
+    are precomputed into one table indexed by the lexer's character classes.
+    """
+
+    def __init__(self, lexer_fa: FA, verify_fa: FA):
+        """
+        lexer_fa:  The lexer FA, see lexer.create_fa
+
+        verify_fa: The step verification FA, see create_fa
+        """
+        lex = lexer_fa.compile()
+        verify = verify_fa.compile(ignore=['SPACE'])
+        width = lex.width
+
+        def token_end(lex_state: int, verify_state: int) -> int | None:
+            # Feed the token recognized in 'lex_state' to the verification FA
+            if lex_state not in lex.final:
+                return None
+            return verify.step(verify_state, lex.state_name(lex_state))
+
+        # Explore all reachable pairs, the code of a pair is the offset of its
+        # row in the table. Pair code 0 is the lexer error state.
+        error = 0
+        pairs = {None: error}
+        queue = [(lex.start, verify.start)]
+        pairs[queue[0]] = width
+        rows = {error: [error] * width}
+        while queue:
+            lex_state, verify_state = pair = queue.pop()
+            row = []
+            for symbol_class in range(width):
+                next_lex = lex.table[lex_state + symbol_class]
+                next_pair = (next_lex, verify_state)
+                if next_lex == lex.dead:
+                    # The current token is complete, start a new one
+                    next_verify = token_end(lex_state, verify_state)
+                    next_lex = lex.table[lex.start + symbol_class]
+                    next_pair = (next_lex, next_verify)
+                    if next_verify is None or next_lex == lex.dead:
+                        next_pair = None
+
+                if next_pair not in pairs:
+                    pairs[next_pair] = len(pairs) * width
+                    queue.append(next_pair)
+                row.append(pairs[next_pair])
+
+            rows[pairs[pair]] = row
+
+        # Verdict at the end of the trace, None for a lexer error
+        verdicts = {}
+        for pair, code in pairs.items():
+            if pair is not None:
+                verify_state = token_end(*pair)
+                verdicts[code] = None if verify_state is None \
+                    else verify_state in verify.final
+
+        # Retain and assign variables
+        self.lexer = lex
+        self.char_classes = lexer.char_classes(lex)
+        self.table = [code for _, row in sorted(rows.items())
+                      for code in row]
+        self.start = width
+        self.error = error
+        self.verdicts = verdicts
+
+    def verify(self, trace: str) -> bool:
+        """
+        Lexes and verifies the raw trace 'trace' in a single pass, equivalent
+        to verify_steps on the result of lexer.lexer
+        returns: True if the trace is valid, false otherwise.
+        If the trace cannot be lexed an FAError is raised, like lexer.lexer.
+        """
+        table = self.table
+        char_classes = self.char_classes
+        error = self.error
+
+        state = self.start
+        try:
+            for char in trace:
+                state = table[state + char_classes[char]]
+                if state == error:
+                    break
+        except KeyError:
+            # Character not accepted by the lexer
+            state = error
+
+        verdict = self.verdicts.get(state)
+        if verdict is None:
+            # Let the table-driven lexer raise the same error as lexer
+            lexer.lex_spans(self.lexer, trace)
+            raise FAError(f"The trace cannot be lexed: \"{trace}\"")
+
+        return verdict
+
+
+def main(file: Path,
+         verbose: bool = False,
+         fused: bool = False,
+         stats: bool = False) -> None:
     """
     Reads multiple traces from the file at 'path' and feeds them first to the
     lexer and then to verify_steps.
+    If 'fused' is set, the traces are verified by a FusedVerifier instead.
+    Results are memoized per trace content, so repeated traces are only
+    lexed and verified once. If 'stats' is set, the hit rates of the memo are
+    printed to stderr.
     """
 
     with file.open(encoding='utf-8') as f:
@@ -89,15 +258,33 @@ def main(file: Path, verbose: bool = False) -> None:
 
     M_lexer = lexer.create_fa(verbose)
     M_verify = create_fa(verbose)
+    memo = TraceMemo()
+
+    if fused:
+        fused_verifier = FusedVerifier(M_lexer, M_verify)
+        fused_key = f"fused {fingerprint(M_lexer)} {fingerprint(M_verify)}"
+        for trace in traces:
+            print(f"Trace : \"{trace}\"")
+            correct = memo.get(fused_key, trace_digest(trace),
+                               lambda: fused_verifier.verify(trace))
+            print(f"Verify: {correct}")
+    else:
+        lexer_key = f"lexer {fingerprint(M_lexer)}"
+        verify_key = f"verify_steps {fingerprint(M_verify)}"
+        for trace in traces:
+            M_lexer.reset()
+            M_verify.reset()
+            print(f"Trace : \"{trace}\"")
+            digest = trace_digest(trace)
+            lexed_trace = memo.get(lexer_key, digest,
+                                   lambda: lexer.lexer(M_lexer, trace))
+            print(f"Lexer : {lexed_trace}")
+            correct = memo.get(verify_key, digest,
+                               lambda: verify_steps(M_verify, lexed_trace))
+            print(f"Verify: {correct}")
 
-    for trace in traces:
-        M_lexer.reset()
-        M_verify.reset()
-        print(f"Trace : \"{trace}\"")
-        lexed_trace = lexer.lexer(M_lexer, trace)
-        print(f"Lexer : {lexed_trace}")
-        correct = verify_steps(M_verify, lexed_trace)
-        print(f"Verify: {correct}")
+    if stats:
+        print(memo.report(), file=sys.stderr)
 
 
 if __name__ == '__main__':
@@ -105,7 +292,11 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Tokenize a TM trace')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='enable verbose mode of FA')
+    parser.add_argument('-f', '--fused', action='store_true',
+                        help='lex and verify in a single pass')
+    parser.add_argument('-s', '--stats', action='store_true',
+                        help='print the hit rates of the trace memo')
     parser.add_argument('tracefile', type=Path,
                         help='file containing traces to verify')
     args = parser.parse_args()
-    main(args.tracefile, args.verbose)
+    main(args.tracefile, args.verbose, args.fused, args.stats)
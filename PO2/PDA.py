@@ -9,6 +9,16 @@
 
 # DO NOT MODIFY THIS FILE
 
+from array import array
+from collections.abc import AsyncIterable, Iterable, Iterator, Sequence
+from itertools import repeat
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is only needed for the batch runner
+    np = None
+
 
 class PDAError(Exception):
     pass
@@ -36,7 +46,8 @@ class PDA:
                  s: str,
                  F: list[str] | set[str],
                  pda_type: str = "final_state",
-                 verbose: bool = False):
+                 verbose: bool = False,
+                 run_length_stack: bool = False):
         """
         Creates the PDA object and performs input sanitization
 
@@ -64,6 +75,10 @@ class PDA:
         verbose:  Indicator of whether to print the new configuration after a
                   transition
 
+        run_length_stack: Indicator of whether to store the stack as runs of
+                  equal symbols (see RunLengthStack) instead of a list, for
+                  PDAs that push long runs of the same symbol
+
         For an example of how to use delta, the definition in slide 67 of
         lecture 5 (with '[]' replaced by '<>' to avoid confusion):
         δ = { ((1, <, ⊥), (1, <⊥)), ((1, >, <), (1, ϵ)), ... }
@@ -122,16 +137,36 @@ class PDA:
             if state_name in F:
                 self.final_states.append(new_state)
 
+        # States from which acceptance is still possible: those that can reach
+        # a final state, or for an empty stack a state that can pop without
+        # pushing. The stack never shrinks below its size on leaving the other
+        # states, which are doomed (see verdict).
+        if pda_type == "empty_stack":
+            live = {lhs[0] for lhs, rhs in delta
+                    if rhs[1] == "ϵ" or not rhs[1]}
+        else:
+            live = set(F)
+        changed = True
+        while changed:
+            changed = False
+            for lhs, rhs in delta:
+                if rhs[0] in live and lhs[0] not in live:
+                    live.add(lhs[0])
+                    changed = True
+        self.doomed_states = {state for name, state in self.states.items()
+                              if name not in live}
+
         # Retain and assign variables
         self.pda_type = pda_type
         self.verbose = verbose
+        self.run_length_stack = run_length_stack
         self.input_alphabet = Sigma
         self.stack_alphabet = Gamma
         self.start_state = self.states[s]
         self.current_state = self.start_state
 
         # Setup stack
-        self.stack = ['⊥']
+        self.stack = self.new_stack()
 
     def transition(self, symbol: str) -> bool:
         """
@@ -196,12 +231,888 @@ class PDA:
         """
         return not self.stack
 
+    def is_accepting(self) -> bool:
+        """
+        Check whether the PDA accepts in its current configuration
+        """
+        if self.pda_type == "final_state":
+            return self.is_final()
+
+        if self.pda_type == "empty_stack":
+            return self.is_empty()
+
+        return False
+
+    def verdict(self) -> bool | None:
+        """
+        Decide whether the PDA accepts before the input is complete
+        returns: True or False if every continuation of the input leads to
+                 that outcome, None if it still depends on the input
+        """
+        top_stack_symbol = self.stack[-1] if self.stack else "ϵ"
+        if top_stack_symbol not in self.current_state.top_stack_symbols:
+            # No relation applies, so the configuration never changes again
+            return self.is_accepting()
+
+        if self.current_state in self.doomed_states and (
+                self.stack or self.pda_type != "empty_stack"):
+            return False
+
+        return None
+
+    def step(self, symbol: str) -> bool | None:
+        """
+        Follow the input 'symbol' as transition does
+        returns: The verdict after the transition (see verdict)
+        """
+        # The verdict can only become decided by a failed transition or by
+        # entering a doomed state
+        if (self.transition(symbol)
+                and self.current_state not in self.doomed_states):
+            return None
+
+        return self.verdict()
+
+    def transition_all(self, list_of_symbols: list[str]) -> bool:
+        """
+        Run PDA against the complete input 'list_of_symbols', stopping as soon
+        as the outcome is decided (see verdict)
+        returns: True if the input is accepted, False otherwise
+        """
+
+        for index, symbol in enumerate(list_of_symbols):
+            if self.step(symbol) is not None:
+                if self.verbose:
+                    print(f"Stopped after {index + 1} symbol(s): the "
+                          f"configuration in state "
+                          f"'{self.current_state.name}' decides the input")
+                break
+
+        return self.is_accepting()
+
+    def new_stack(self) -> 'list[str] | RunLengthStack':
+        """
+        Create the initial stack
+        """
+        if self.run_length_stack:
+            return RunLengthStack(['⊥'])
+        return ['⊥']
+
+    def reset(self) -> None:
+        self.current_state = self.start_state
+        self.stack = self.new_stack()
+
+    def compile(self) -> 'CompiledPDA':
+        """
+        Compile the PDA into an integer-coded transition table
+        returns: A CompiledPDA accepting the same inputs as this PDA
+        """
+        return CompiledPDA(self)
+
+    def run_batch(self,
+                  list_of_symbols: Sequence[Sequence[str]]) -> 'np.ndarray':
+        """
+        Run the PDA against many complete inputs at once, see
+        CompiledPDA.run_batch
+        returns: A boolean NumPy array, True for every accepted input
+        """
+        return self.compile().run_batch(list_of_symbols)
+
+
+class CompiledPDA:
+    """
+    Pushdown Automaton (PDA) compiled to integer codes
+
+    States, input symbols and stack symbols are interned to small integers,
+    the stack is an array('H') of stack symbol codes, and the transition
+    relation is a flat table indexed by (state, input symbol, top of the
+    stack), holding the index of an action (new state and symbols to push)
+    or -1 if no relation applies. The empty stack has the top 'ϵ', as in PDA.
+    The compiled PDA has no verbose mode.
+    """
+
+    def __init__(self, pda: PDA):
+        """
+        pda: The PDA to compile
+        """
+        self.state_names = list(pda.states)
+        self.stack_names = list(dict.fromkeys([*pda.stack_alphabet,
+                                               '⊥', 'ϵ']))
+        if len(self.stack_names) > 1 << 16:
+            raise PDAError("Too many stack symbols to compile: "
+                           f"{len(self.stack_names)}")
+
+        state_codes = {name: code
+                       for code, name in enumerate(self.state_names)}
+        self.stack_codes = {name: code
+                            for code, name in enumerate(self.stack_names)}
+        # Input symbols outside Sigma get the last code, without relations
+        self.symbol_codes = {name: code for code, name
+                             in enumerate(dict.fromkeys(pda.input_alphabet))}
+        self.unknown = len(self.symbol_codes)
+
+        self.width = len(self.stack_names)
+        self.row = (self.unknown + 1) * self.width
+        self.table = [-1] * (len(self.state_names) * self.row)
+        self.next_states = []
+        self.pushes = []
+        for name, state in pda.states.items():
+            for (symbol, top), (new_state, push) in \
+                    state.transition_table.items():
+                index = self.index(state_codes[name],
+                                   self.symbol_codes[symbol],
+                                   self.stack_codes[top])
+                self.table[index] = len(self.next_states)
+                self.next_states.append(state_codes[new_state])
+                # Stored in push order, the top of the stack last
+                self.pushes.append(array('H', [
+                    self.stack_codes[symbol]
+                    for symbol in ([] if push == "ϵ" else reversed(push))]))
+
+        # Early rejection, see PDA.verdict
+        self.doomed = bytes(state in pda.doomed_states
+                            for state in pda.states.values())
+        self.frozen = bytes(
+            self.stack_names[top] not in state.top_stack_symbols
+            for state in pda.states.values() for top in range(self.width))
+
+        self.final = bytes(state in pda.final_states
+                           for state in pda.states.values())
+        self.empty_stack = pda.pda_type == "empty_stack"
+        self.pda_type = pda.pda_type
+        self.start = state_codes[pda.start_state.name]
+        self.empty = self.stack_codes['ϵ']
+        self.bottom = self.stack_codes['⊥']
+
+        self.reset()
+
+    def index(self, state: int, symbol: int, top: int) -> int:
+        """ Index of the table entry for the given codes """
+        return state * self.row + symbol * self.width + top
+
+    def transition(self, symbol: str) -> bool:
+        """
+        Try to follow the input 'symbol' from the current state
+        returns: True if succeeded, false otherwise
+        """
+        stack = self.stack
+        top = stack.pop() if stack else self.empty
+        action = self.table[self.index(
+            self.state, self.symbol_codes.get(symbol, self.unknown), top)]
+        if action < 0:
+            if top != self.empty:
+                stack.append(top)
+            return False
+
+        self.state = self.next_states[action]
+        stack.extend(self.pushes[action])
+        return True
+
     def transition_all(self, list_of_symbols: list[str]) -> bool:
         """
-        Run PDA against the complete input 'list_of_symbols'
+        Run the PDA against the complete input 'list_of_symbols', stopping as
+        soon as the outcome is decided (see PDA.verdict)
         returns: True if the input is accepted, False otherwise
         """
+        table = self.table
+        next_states = self.next_states
+        pushes = self.pushes
+        doomed = self.doomed
+        frozen = self.frozen
+        codes = self.symbol_codes.get
+        unknown = self.unknown
+        row = self.row
+        width = self.width
+        empty = self.empty
+        empty_stack = self.empty_stack
+        stack = self.stack
+        pop = stack.pop
+        push = stack.append
+        extend = stack.extend
+
+        state = self.state
+        for symbol in list_of_symbols:
+            top = pop() if stack else empty
+            action = table[state * row + codes(symbol, unknown) * width + top]
+            if action < 0:
+                if top != empty:
+                    push(top)
+                if frozen[state * width + top]:
+                    break
+                continue
+
+            state = next_states[action]
+            extend(pushes[action])
+            if doomed[state] and (stack or not empty_stack):
+                break
+
+        self.state = state
+        return self.is_accepting()
+
+    # Below this number of rows, the NumPy overhead per input column costs
+    # more than running the rows one by one
+    scalar_rows = 128
+
+    def run_batch(self,
+                  list_of_symbols: Sequence[Sequence[str]]) -> 'np.ndarray':
+        """
+        Run all inputs in 'list_of_symbols' in lockstep. The inputs are
+        sorted by length and split into buckets of similar lengths, so short
+        inputs are not padded to the longest one. Within a bucket the inputs
+        are encoded as a padded matrix of symbol codes, and the configurations
+        as a vector of states, a matrix with a stack in every row and a vector
+        of stack sizes. Every column of inputs is a few NumPy indexing
+        operations over the rows that are still undecided (see PDA.verdict).
+        Padding uses the code of the symbols outside Sigma, which has no
+        relations, so it leaves the configuration unchanged. Rows that are
+        done are dropped when the stack matrix grows, and once fewer than
+        'scalar_rows' rows are left they finish with transition_all.
+        returns: A boolean NumPy array, True for every accepted input
+        """
+        if np is None:
+            raise PDAError("NumPy is required for CompiledPDA.run_batch")
+
+        depth = max(map(len, self.pushes), default=0)
+        pushes = np.zeros((len(self.pushes), depth), dtype=np.uint16)
+        for push_row, push in zip(pushes, self.pushes):
+            push_row[:len(push)] = push
+        tables = (np.array(self.table, dtype=np.intp),
+                  np.array(self.next_states, dtype=np.intp),
+                  np.array(list(map(len, self.pushes)), dtype=np.intp),
+                  pushes,
+                  np.frombuffer(self.doomed, dtype=bool),
+                  np.frombuffer(self.frozen, dtype=bool))
+
+        accepted = np.zeros(len(list_of_symbols), dtype=bool)
+        order = sorted(range(len(list_of_symbols)),
+                       key=lambda row: len(list_of_symbols[row]))
+
+        # The configuration of the PDA is used to finish rows one by one
+        configuration = self.state, self.stack
+        try:
+            start = 0
+            while start < len(order):
+                # Bucket of the inputs at most about twice as long
+                limit = 2 * len(list_of_symbols[order[start]]) + 16
+                end = start
+                while (end < len(order) and
+                       len(list_of_symbols[order[end]]) <= limit):
+                    end += 1
+                self.run_bucket(list_of_symbols, order[start:end], tables,
+                                accepted)
+                start = end
+        finally:
+            self.state, self.stack = configuration
+
+        return accepted
+
+    def run_bucket(self,
+                   list_of_symbols: Sequence[Sequence[str]],
+                   bucket: list[int],
+                   tables: tuple,
+                   accepted: 'np.ndarray') -> None:
+        """
+        Run the inputs at the indices 'bucket' of 'list_of_symbols' in
+        lockstep, see run_batch, and set their verdicts in 'accepted'
+        """
+        table, next_states, push_sizes, pushes, doomed, frozen = tables
+        width = self.width
+        row = self.row
+        empty = self.empty
+        padding = self.unknown
+        final = np.frombuffer(self.final, dtype=bool)
+
+        rows = np.array(bucket, dtype=np.intp)
+        lengths = np.array([len(list_of_symbols[index]) for index in bucket],
+                           dtype=np.intp)
+        length = lengths.max(initial=0)
+        inputs = np.full((len(rows), length), padding,
+                         dtype=np.uint8 if padding < 256 else np.uint16)
+        code = self.symbol_codes.get
+        for input_row, index in zip(inputs, bucket):
+            symbols = list_of_symbols[index]
+            input_row[:len(symbols)] = list(
+                map(code, symbols, repeat(padding, len(symbols))))
+
+        states = np.full(len(rows), self.start, dtype=np.intp)
+        stacks = np.zeros((len(rows), max(2 * pushes.shape[1], 16)),
+                          dtype=np.uint16)
+        stacks[:, 0] = self.bottom
+        sizes = np.ones(len(rows), dtype=np.intp)
+
+        def finish(live: 'np.ndarray') -> None:
+            # Set the verdicts of the rows at the positions 'live'
+            if self.pda_type == "final_state":
+                accepted[rows[live]] = final[states[live]]
+            elif self.pda_type == "empty_stack":
+                accepted[rows[live]] = sizes[live] == 0
+
+        # Positions of the rows that still read input and are not decided
+        live = np.arange(len(rows))
+        for column in range(length):
+            done = lengths[live] <= column
+            if done.any():
+                finish(live[done])
+                live = live[~done]
+
+            if len(live) < self.scalar_rows:
+                for position in live:
+                    self.state = int(states[position])
+                    self.stack = array('H', stacks[position,
+                                                   :sizes[position]])
+                    accepted[rows[position]] = self.transition_all(
+                        list_of_symbols[rows[position]][column:])
+                return
+
+            state = states[live]
+            size = sizes[live]
+            nonempty = size > 0
+            top = np.where(nonempty,
+                           stacks[live, np.maximum(size - 1, 0)], empty)
+            action = table[state * row + inputs[live, column] * width + top]
+            hit = action >= 0
+
+            # A miss leaves the configuration unchanged, and decides it if
+            # no relation applies to it at all
+            decided = ~hit & frozen[state * width + top]
+
+            # Pop the top and push the symbols of the action
+            action = action[hit]
+            size = size[hit] - nonempty[hit]
+            push_size = push_sizes[action]
+            new_size = size + push_size
+            needed = new_size.max(initial=0)
+            if needed > stacks.shape[1]:
+                # Grow the stacks of the live rows only, dropping the others
+                grown = np.zeros((len(live), max(needed,
+                                                 2 * stacks.shape[1])),
+                                 dtype=np.uint16)
+                grown[:, :stacks.shape[1]] = stacks[live]
+                stacks = grown
+                rows = rows[live]
+                lengths = lengths[live]
+                inputs = inputs[live]
+                states = states[live]
+                sizes = sizes[live]
+                live = np.arange(len(live))
+            moved = live[hit]
+            for index in range(pushes.shape[1]):
+                write = push_size > index
+                stacks[moved[write], size[write] + index] = \
+                    pushes[action[write], index]
+
+            new_state = next_states[action]
+            states[moved] = new_state
+            sizes[moved] = new_size
+            decided[hit] = doomed[new_state] & (
+                (new_size > 0) | (not self.empty_stack))
+            if decided.any():
+                finish(live[decided])
+                live = live[~decided]
+
+        finish(live)
+
+    def verdict(self) -> bool | None:
+        """
+        Decide whether the PDA accepts before the input is complete
+        returns: True or False if every continuation of the input leads to
+                 that outcome, None if it still depends on the input
+        """
+        top = self.stack[-1] if self.stack else self.empty
+        if self.frozen[self.state * self.width + top]:
+            return self.is_accepting()
+
+        if self.doomed[self.state] and (self.stack or not self.empty_stack):
+            return False
+
+        return None
+
+    def is_final(self) -> bool:
+        """
+        Check whether the current state is a final state
+        """
+        return bool(self.final[self.state])
+
+    def is_empty(self) -> bool:
+        """
+        Check whether the PDA stack is empty
+        """
+        return not self.stack
+
+    def is_accepting(self) -> bool:
+        """
+        Check whether the PDA accepts in its current configuration
+        """
+        if self.pda_type == "final_state":
+            return self.is_final()
+
+        if self.pda_type == "empty_stack":
+            return self.is_empty()
+
+        return False
+
+    def current_name(self) -> str:
+        """ Name of the current state """
+        return self.state_names[self.state]
+
+    def stack_symbols(self) -> list[str]:
+        """ The stack as stack symbols, the top of the stack last """
+        return [self.stack_names[code] for code in self.stack]
+
+    def reset(self) -> None:
+        self.state = self.start
+        self.stack = array('H', [self.bottom])
+
+
+class PDAStream:
+    """
+    Resumable consumer feeding tokens to a Pushdown Automaton (PDA) as they
+    arrive, e.g. from a generator, a socket or an asyncio stream
+
+    The stack is persistent: a chain of (symbol, below) cells, with None as
+    the empty stack, so a configuration is an immutable (state, stack) pair
+    that snapshot and restore copy in O(1). The PDA itself is not changed.
+    """
+
+    def __init__(self, pda: PDA):
+        """
+        pda: The PDA to feed, its configuration is not used
+        """
+        self.pda = pda
+        self.reset()
+
+    def feed(self, symbol: str) -> bool | None:
+        """
+        Follow the input 'symbol' from the current configuration, as in
+        PDA.transition. Once the outcome is decided the symbol is ignored.
+        returns: The verdict (see PDA.verdict)
+        """
+        if self.decided is not None:
+            return self.decided
+        self.consumed += 1
+
+        state = self.state
+        stack = self.stack
+        top_stack_symbol = "ϵ" if stack is None else stack[0]
+        rhs = state.transition_table.get((symbol, top_stack_symbol))
+        if rhs is None:
+            self.decided = self.verdict()
+            return self.decided
+
+        new_state_name, new_top_stack = rhs
+        if stack is not None:
+            stack = stack[1]
+        if new_top_stack != "ϵ":
+            for element in reversed(new_top_stack):
+                stack = (element, stack)
+        self.state = self.pda.states[new_state_name]
+        self.stack = stack
+
+        if self.state in self.pda.doomed_states:
+            self.decided = self.verdict()
+        return self.decided
+
+    def feed_all(self, symbols: Iterable[str]) -> bool | None:
+        """
+        Feed the tokens of 'symbols', stopping as soon as the outcome is
+        decided, so the rest of the tokens are not consumed
+        returns: The verdict (see PDA.verdict)
+        """
+        for symbol in symbols:
+            if self.feed(symbol) is not None:
+                break
+
+        return self.decided
+
+    async def afeed(self, symbols: AsyncIterable[str]) -> bool | None:
+        """
+        Feed the tokens of the asynchronous iterable 'symbols', like feed_all
+        returns: The verdict (see PDA.verdict)
+        """
+        async for symbol in symbols:
+            if self.feed(symbol) is not None:
+                break
+
+        return self.decided
+
+    def verdict(self) -> bool | None:
+        """
+        Decide whether the input is accepted, whatever tokens follow
+        returns: True or False if every continuation of the input leads to
+                 that outcome, None if it still depends on the input
+        """
+        top_stack_symbol = "ϵ" if self.stack is None else self.stack[0]
+        if top_stack_symbol not in self.state.top_stack_symbols:
+            return self.accepts()
+
+        if self.state in self.pda.doomed_states and (
+                self.stack is not None or
+                self.pda.pda_type != "empty_stack"):
+            return False
+
+        return None
+
+    def accepts(self) -> bool:
+        """
+        Provisional verdict: whether the input so far is accepted, i.e. the
+        verdict if the input ended now
+        """
+        if self.pda.pda_type == "final_state":
+            return self.state in self.pda.final_states
+
+        if self.pda.pda_type == "empty_stack":
+            return self.stack is None
+
+        return False
+
+    def stack_symbols(self) -> list[str]:
+        """ The stack as stack symbols, the top of the stack last """
+        symbols = []
+        stack = self.stack
+        while stack is not None:
+            symbols.append(stack[0])
+            stack = stack[1]
+        symbols.reverse()
+
+        return symbols
+
+    def snapshot(self) -> tuple:
+        """
+        The current configuration, to be passed to restore
+        """
+        return self.state, self.stack, self.decided, self.consumed
+
+    def restore(self, snapshot: tuple) -> None:
+        """
+        Return to the configuration of 'snapshot' (see snapshot)
+        """
+        self.state, self.stack, self.decided, self.consumed = snapshot
+
+    def reset(self) -> None:
+        self.state = self.pda.start_state
+        self.stack = ('⊥', None)
+        self.decided = None
+        # Number of tokens followed, excluding those ignored once decided
+        self.consumed = 0
+
+
+class RunLengthStack:
+    """
+    Stack of a Pushdown Automaton (PDA) stored as runs of equal symbols
+
+    Every run is a symbol and its count, so pushing or popping a symbol equal
+    to the top of the stack only changes a count, and memory is proportional
+    to the number of symbol changes instead of the depth of the stack. Like a
+    list, the top of the stack is at the end.
+    """
+
+    def __init__(self, symbols: Iterable[str] = ()):
+        """
+        symbols: The initial stack, from bottom to top
+        """
+        self.symbols = []
+        self.counts = []
+        self.size = 0
+        for symbol in symbols:
+            self.append(symbol)
+
+    def append(self, symbol: str) -> None:
+        """ Push 'symbol' on top of the stack """
+        if self.symbols and self.symbols[-1] == symbol:
+            self.counts[-1] += 1
+        else:
+            self.symbols.append(symbol)
+            self.counts.append(1)
+        self.size += 1
+
+    def pop(self) -> str:
+        """ Remove and return the top of the stack """
+        if not self.size:
+            raise IndexError("pop from empty stack")
+
+        symbol = self.symbols[-1]
+        if self.counts[-1] == 1:
+            self.symbols.pop()
+            self.counts.pop()
+        else:
+            self.counts[-1] -= 1
+        self.size -= 1
+
+        return symbol
+
+    def runs(self) -> list[tuple[str, int]]:
+        """ The runs of the stack as (symbol, count) pairs, bottom first """
+        return list(zip(self.symbols, self.counts))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("stack index out of range")
+        if index == self.size - 1:
+            return self.symbols[-1]
+
+        for symbol, count in zip(self.symbols, self.counts):
+            if index < count:
+                return symbol
+            index -= count
+
+    def __iter__(self) -> Iterator[str]:
+        for symbol, count in zip(self.symbols, self.counts):
+            for _ in range(count):
+                yield symbol
+
+    def __reversed__(self) -> Iterator[str]:
+        for symbol, count in zip(reversed(self.symbols),
+                                 reversed(self.counts)):
+            for _ in range(count):
+                yield symbol
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, RunLengthStack):
+            return self.runs() == other.runs()
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"RunLengthStack({self.runs()})"
+
+
+class NPDA:
+    """
+    Nondeterministic Pushdown Automaton (NPDA)
+
+    Unlike PDA, the transition relation may contain several relations with
+    the same left-hand side, and relations with input symbol 'ϵ' that are
+    followed without reading input. The NPDA tracks the set of all live
+    configurations in a graph-structured stack (GSS), as in Tomita's
+    generalized LR parsing. A StackNode stands for a set of stacks: its
+    symbol on top of any of the stacks of the nodes below it. Every
+    configuration is a pair (state, node), so it stands for one state with a
+    set of stacks.
+
+    Within one input symbol, all branches that push the same symbols and
+    enter the same state share a single chain of new nodes, and the stacks
+    they push on are merged as edges below the chain. Popping a node
+    continues in every node below it, and nodes that get a new edge below
+    later in the same ϵ-closure replay the pops that already happened
+    (reductions, in Tomita's terms). The number of nodes created per
+    symbol is bounded by the number of distinct (state, push) pairs of the
+    relations, so the configurations and the work per symbol grow
+    polynomially with the input, instead of exponentially with the number
+    of branches. Every configuration is expanded at most once per
+    ϵ-closure, and relations with input symbol 'ϵ' that push symbols
+    forever lead to cycles in the GSS instead of infinitely many
+    configurations.
+
+    As in PDA, the top 'ϵ' in a left-hand side only matches the empty stack,
+    and by default a configuration without an applicable relation stays
+    unchanged. With 'blocking' set, such a configuration dies instead, as in
+    the usual definition of a nondeterministic PDA.
+    """
+
+    def __init__(self,
+                 Q: list[str] | set[str],
+                 Sigma: list[str] | set[str],
+                 Gamma: list[str] | set[str],
+                 delta: list[tuple[tuple[str, str, str],
+                                   tuple[str, list[str] | str]]],
+                 s: str,
+                 F: list[str] | set[str],
+                 pda_type: str = "final_state",
+                 verbose: bool = False,
+                 blocking: bool = False):
+        """
+        Creates the NPDA object and performs input sanitization
+
+        The arguments are the same as for PDA, except that 'input_symbol' in
+        the left-hand side of a relation may also be 'ϵ', and:
+
+        blocking: Indicator of whether configurations without an applicable
+                  relation die, instead of staying unchanged
+        """
+
+        # Verify proper use of states
+        if len(Q) != len(set(Q)):
+            raise StateError("Q contains duplicates")
+
+        if s not in Q:
+            raise StateError(f"Starting state '{s}' not in Q: {Q}")
+
+        for state in F:
+            if state not in Q:
+                raise StateError(f"Final state '{state}' not in Q: {Q}")
+
+        # Verify proper use of transitions
+        for lhs, rhs in delta:
+            # Left-hand side
+            state, input_symbol, top_stack = lhs
+            if state not in Q:
+                raise TransitionError(f"State '{state}' not in Q: {Q}")
+            if input_symbol not in Sigma and input_symbol != "ϵ":
+                raise TransitionError(f"Symbol '{input_symbol}' for relation "
+                                      f"'{(lhs, rhs)}' not in Sigma: {Sigma}")
+            if top_stack not in Gamma and top_stack != "ϵ":
+                raise TransitionError(f"Stack symbol '{top_stack}' for "
+                                      f"relation '{(lhs, rhs)}' not in Gamma: "
+                                      f"{Gamma}")
+            # Right-hand side
+            state, top_stack_list = rhs
+            if state not in Q:
+                raise TransitionError(f"State '{state}' not in Q: {Q}")
+            if top_stack_list != "ϵ":
+                for stack_symbol in top_stack_list:
+                    if stack_symbol not in Gamma:
+                        raise TransitionError(
+                            f"Stack symbol '{stack_symbol}' for relation "
+                            f"'{(lhs, rhs)}' not in Gamma: {Gamma}")
+
+        # All relations per left-hand side, pushing symbols top first
+        self.relations = {}
+        for lhs, (state, top_stack_list) in delta:
+            push = () if top_stack_list == "ϵ" else tuple(top_stack_list)
+            self.relations.setdefault(lhs, []).append((state, push))
+
+        # Retain and assign variables
+        self.pda_type = pda_type
+        self.verbose = verbose
+        self.blocking = blocking
+        self.input_alphabet = Sigma
+        self.stack_alphabet = Gamma
+        self.final_states = set(F)
+        self.start_state = s
+        self.reset()
+
+    def begin(self) -> None:
+        """
+        Start the configurations of the next input symbol
+        """
+        self.configurations = set()
+        # Configurations whose ϵ-closure is (being) computed
+        self.expanded = set()
+        self.worklist = []
+        # Chains of new nodes per (state, push), shared by all branches
+        self.chains = {}
+        # What happened to each node popped during this symbol, replayed
+        # when the node gets a new edge below: ('state', state) continued in
+        # 'state' in the nodes below, ('node', node) pushed a chain on them
+        # with 'node' at its bottom
+        self.pops = {}
+
+    def configure(self, state: str, node: 'StackNode | None',
+                  expand: bool = True) -> None:
+        """
+        Add the configuration (state, node), and unless 'expand' is False
+        follow its ϵ-relations in the closure
+        """
+        configuration = (state, node)
+        self.configurations.add(configuration)
+        if expand and configuration not in self.expanded:
+            self.expanded.add(configuration)
+            self.worklist.append(configuration)
+
+    def link(self, node: 'StackNode', below: 'StackNode | None') -> None:
+        """
+        Add the edge from 'node' to 'below', and replay the pops of 'node'
+        (and the nodes it was pushed below) over the new edge
+        """
+        edges = [(node, below)]
+        while edges:
+            node, below = edges.pop()
+            if below in node.below:
+                continue
+            node.below.add(below)
+            for kind, target in self.pops.get(node, ()):
+                if kind == 'state':
+                    self.configure(target, below)
+                else:
+                    edges.append((target, below))
+
+    def apply(self, node: 'StackNode | None', new_state: str,
+              push: tuple[str, ...]) -> None:
+        """
+        Pop 'node' (the empty stack if None), and push 'push' (top first) on
+        every stack below it while entering 'new_state'
+        """
+        below = (None,) if node is None else tuple(node.below)
+
+        if not push:
+            if node is not None:
+                self.pops.setdefault(node, []).append(('state', new_state))
+            for stack in below:
+                self.configure(new_state, stack)
+            return
 
+        key = (new_state, push)
+        chain = self.chains.get(key)
+        if chain is None:
+            bottom = top = StackNode(push[-1], set())
+            for symbol in reversed(push[:-1]):
+                top = StackNode(symbol, {top})
+            chain = self.chains[key] = (top, bottom)
+        top, bottom = chain
+
+        if node is not None:
+            self.pops.setdefault(node, []).append(('node', bottom))
+        for stack in below:
+            self.link(bottom, stack)
+        self.configure(new_state, top)
+
+    def close(self) -> None:
+        """
+        Compute the ϵ-closure of the current configurations
+        """
+        relations = self.relations
+        worklist = self.worklist
+        while worklist:
+            state, node = worklist.pop()
+            top = "ϵ" if node is None else node.symbol
+            for new_state, push in relations.get((state, "ϵ", top), ()):
+                self.apply(node, new_state, push)
+
+    def transition(self, symbol: str) -> bool:
+        """
+        Follow the input 'symbol' from all current configurations
+        returns: True if any configuration made a transition, False otherwise
+        """
+        relations = self.relations
+        configurations = self.configurations
+        self.begin()
+
+        moved = False
+        for configuration in configurations:
+            state, node = configuration
+            top = "ϵ" if node is None else node.symbol
+            targets = relations.get((state, symbol, top))
+            if not targets:
+                if not self.blocking:
+                    self.configure(state, node, expand=False)
+                continue
+
+            moved = True
+            for new_state, push in targets:
+                self.apply(node, new_state, push)
+
+        self.close()
+
+        if self.verbose:
+            print(f"Read '{symbol}': {len(self.configurations)} "
+                  "configuration(s)")
+            for state, node in self.configurations:
+                top = "ϵ" if node is None else node.symbol
+                print(f"State: '{state}'| Stack: top -> {top}")
+
+        return moved
+
+    def transition_all(self, list_of_symbols: list[str]) -> bool:
+        """
+        Run NPDA against the complete input 'list_of_symbols'
+        returns: True if the input is accepted, False otherwise
+        """
         for symbol in list_of_symbols:
             self.transition(symbol)
 
@@ -213,9 +1124,42 @@ class PDA:
 
         return False
 
+    def is_final(self) -> bool:
+        """
+        Check whether any current configuration is in a final state
+        """
+        return any(state in self.final_states
+                   for state, _ in self.configurations)
+
+    def is_empty(self) -> bool:
+        """
+        Check whether any current configuration has an empty stack
+        """
+        return any(node is None for _, node in self.configurations)
+
     def reset(self) -> None:
-        self.current_state = self.start_state
-        self.stack = ['⊥']
+        self.begin()
+        self.configure(self.start_state, StackNode('⊥', {None}))
+        self.close()
+
+
+class StackNode:
+    """
+    Node of a graph-structured stack, see NPDA: the stacks with 'symbol' on
+    top of any of the stacks of the nodes in 'below'. Nodes are compared by
+    identity.
+    """
+    __slots__ = ('symbol', 'below')
+
+    def __init__(self, symbol: str, below: 'set[StackNode | None]'):
+        """
+        symbol: The top of the stacks
+
+        below:  The nodes of the stacks below the top, None for the empty
+                stack
+        """
+        self.symbol = symbol
+        self.below = below
 
 
 class State:
@@ -241,3 +1185,7 @@ class State:
         for lhs, rhs in relations:
             transition_table[lhs[1:]] = rhs
         self.transition_table = transition_table
+
+        # The stack tops for which some relation applies
+        self.top_stack_symbols = {top_stack for _, top_stack
+                                  in transition_table}
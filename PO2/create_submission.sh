@@ -12,5 +12,5 @@ else
     TAR="tar"
 fi
 
-echo "$TAR --create --gz --verbose --file PO2.tar.gz --transform \"s,^,PO2/,\" PDA.py verification.py answers.txt original_traces.txt tokenized_traces.txt"
-$TAR --create --gz --verbose --file PO2.tar.gz --transform "s,^,PO2/," PDA.py verification.py answers.txt original_traces.txt tokenized_traces.txt
+echo "$TAR --create --gz --verbose --file PO2.tar.gz --transform \"s,^,PO2/,\" PDA.py grammar.py verification.py answers.txt original_traces.txt tokenized_traces.txt -C ../PO1 memo.py"
+$TAR --create --gz --verbose --file PO2.tar.gz --transform "s,^,PO2/," PDA.py grammar.py verification.py answers.txt original_traces.txt tokenized_traces.txt -C ../PO1 memo.py
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#  Framework for Automaten en Formele Talen             #
+#  Written by: Robin Visser & Tristan Laan              #
+#  based on work by: Bas van den Heuvel & Daan de Graaf #
+#                                                       #
+#  This work is licensed under a Creative Commons       #
+#  “Attribution-ShareAlike 4.0 International”  license. #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+from PDA import PDA, PDAError
+from collections.abc import Iterable
+from pathlib import Path
+import hashlib
+import json
+import os
+
+# Marker for the end of the input in FOLLOW sets and parse tables
+END = '$'
+
+# The trace token alphabet, see PO1/lexer.py
+TOKENS = ['MLEFT', 'MRIGHT', 'READ', 'WRITE', 'BLANK', 'LEM', 'SYMBOL']
+
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'afl-grammars'
+
+
+class GrammarError(PDAError):
+    pass
+
+
+class Grammar:
+    """
+    Context-free grammar (CFG) over the trace token alphabet
+    """
+
+    def __init__(self,
+                 productions: dict[str, list[list[str] | str]],
+                 start: str,
+                 terminals: list[str] | set[str] | None = None):
+        """
+        Creates the grammar object and performs input sanitization
+
+        productions: A dictionary with elements in the form:
+                     nonterminal: [alternative*], where every alternative is
+                     a list of symbols (terminals and nonterminals), and the
+                     empty list or 'ϵ' is the empty string.
+
+        start:       The start symbol, a nonterminal
+
+        terminals:   The terminals (token alphabet), by default all symbols
+                     in the alternatives that are not nonterminals
+        """
+        if start not in productions:
+            raise GrammarError(f"Start symbol '{start}' has no productions")
+
+        self.productions = {
+            nonterminal: [() if alternative == 'ϵ' else tuple(alternative)
+                          for alternative in alternatives]
+            for nonterminal, alternatives in productions.items()}
+
+        used = {symbol for alternatives in self.productions.values()
+                for alternative in alternatives for symbol in alternative}
+        if terminals is None:
+            terminals = sorted(used - set(self.productions))
+
+        for symbol in used:
+            if symbol not in self.productions and symbol not in terminals:
+                raise GrammarError(f"Symbol '{symbol}' is neither a "
+                                   f"nonterminal nor in the terminals: "
+                                   f"{terminals}")
+            if symbol == END:
+                raise GrammarError(f"Symbol '{END}' is reserved")
+
+        self.start = start
+        self.terminals = list(terminals)
+
+    @classmethod
+    def from_text(cls,
+                  text: str,
+                  terminals: list[str] | set[str] | None = None) -> 'Grammar':
+        """
+        Parses a grammar written as rules of the form
+            A -> X Y Z | ϵ
+        with whitespace-separated symbols, one or more rules per line, and
+        '#' starting a comment. The start symbol is the left-hand side of the
+        first rule.
+        """
+        productions = {}
+        start = None
+        for line in text.splitlines():
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            if '->' not in line:
+                raise GrammarError(f"Rule '{line}' has no '->'")
+
+            nonterminal, alternatives = line.split('->', 1)
+            nonterminal = nonterminal.strip()
+            if start is None:
+                start = nonterminal
+            for alternative in alternatives.split('|'):
+                symbols = [symbol for symbol in alternative.split()
+                           if symbol != 'ϵ']
+                productions.setdefault(nonterminal, []).append(symbols)
+
+        if start is None:
+            raise GrammarError("The grammar has no rules")
+
+        return cls(productions, start, terminals)
+
+    def key(self) -> str:
+        """
+        Hash of the grammar, identifying its compiled tables
+        """
+        definition = repr((self.start, sorted(self.terminals),
+                           sorted(self.productions.items())))
+        return hashlib.sha256(definition.encode('utf-8')).hexdigest()
+
+    def nullable(self) -> set[str]:
+        """
+        The nonterminals that derive the empty string
+        """
+        nullable = set()
+        changed = True
+        while changed:
+            changed = False
+            for nonterminal, alternatives in self.productions.items():
+                if nonterminal not in nullable and any(
+                        all(symbol in nullable for symbol in alternative)
+                        for alternative in alternatives):
+                    nullable.add(nonterminal)
+                    changed = True
+
+        return nullable
+
+    def first_sets(self) -> dict[str, set[str]]:
+        """
+        The FIRST set of every nonterminal
+        """
+        nullable = self.nullable()
+        first = {nonterminal: set() for nonterminal in self.productions}
+        changed = True
+        while changed:
+            changed = False
+            for nonterminal, alternatives in self.productions.items():
+                for alternative in alternatives:
+                    new = self.first_of(alternative, first, nullable)
+                    if not new <= first[nonterminal]:
+                        first[nonterminal] |= new
+                        changed = True
+
+        return first
+
+    def first_of(self,
+                 symbols: tuple[str, ...],
+                 first: dict[str, set[str]],
+                 nullable: set[str]) -> set[str]:
+        """
+        The FIRST set of the sequence 'symbols'
+        """
+        result = set()
+        for symbol in symbols:
+            if symbol not in self.productions:
+                result.add(symbol)
+                break
+            result |= first[symbol]
+            if symbol not in nullable:
+                break
+
+        return result
+
+    def follow_sets(self) -> dict[str, set[str]]:
+        """
+        The FOLLOW set of every nonterminal, END marks the end of the input
+        """
+        nullable = self.nullable()
+        first = self.first_sets()
+        follow = {nonterminal: set() for nonterminal in self.productions}
+        follow[self.start].add(END)
+        changed = True
+        while changed:
+            changed = False
+            for nonterminal, alternatives in self.productions.items():
+                for alternative in alternatives:
+                    for index, symbol in enumerate(alternative):
+                        if symbol not in self.productions:
+                            continue
+                        rest = alternative[index + 1:]
+                        new = self.first_of(rest, first, nullable)
+                        if all(other in nullable for other in rest):
+                            new |= follow[nonterminal]
+                        if not new <= follow[symbol]:
+                            follow[symbol] |= new
+                            changed = True
+
+        return follow
+
+    def ll1_table(self) -> dict[str, dict[str, tuple[str, ...]]]:
+        """
+        Builds the LL(1) parse table, and checks that the grammar is LL(1)
+        returns: For every nonterminal and lookahead terminal (or END), the
+                 alternative to expand
+        """
+        nullable = self.nullable()
+        first = self.first_sets()
+        follow = self.follow_sets()
+
+        table = {nonterminal: {} for nonterminal in self.productions}
+        conflicts = []
+        for nonterminal, alternatives in self.productions.items():
+            for alternative in alternatives:
+                lookaheads = self.first_of(alternative, first, nullable)
+                if all(symbol in nullable for symbol in alternative):
+                    lookaheads |= follow[nonterminal]
+
+                for lookahead in lookaheads:
+                    other = table[nonterminal].setdefault(lookahead,
+                                                          alternative)
+                    if other != alternative:
+                        conflicts.append(
+                            f"{nonterminal} on '{lookahead}': "
+                            f"{list(other)} / {list(alternative)}")
+
+        if conflicts:
+            raise GrammarError("The grammar is not LL(1): " +
+                               "; ".join(conflicts))
+
+        return table
+
+
+class LL1Parser:
+    """
+    Table-driven LL(1) parser, accepting the language of an LL(1) grammar in
+    time linear in the length of the input
+    """
+
+    def __init__(self,
+                 table: dict[str, dict[str, list[str] | tuple[str, ...]]],
+                 start: str,
+                 terminals: list[str]):
+        """
+        table:     The LL(1) parse table, see Grammar.ll1_table
+
+        start:     The start symbol
+
+        terminals: The terminals of the grammar
+        """
+        self.table = table
+        self.start = start
+        self.terminals = terminals
+        self.terminal_set = frozenset(terminals)
+
+        # Right-hand sides reversed once, so expanding is a single extend
+        self.expansions = {
+            nonterminal: {lookahead: tuple(reversed(alternative))
+                          for lookahead, alternative in row.items()}
+            for nonterminal, row in table.items()}
+
+    def accepts(self, tokens: Iterable[str]) -> bool:
+        """
+        Check whether the tokens are a sentence of the grammar
+        """
+        expansions = self.expansions
+        terminals = self.terminal_set
+        stack = [END, self.start]
+        for token in tokens:
+            if token not in terminals or token == END:
+                # Only terminals can match, not END or a token that is
+                # named like a nonterminal
+                return False
+            top = stack.pop()
+            while top != token:
+                row = expansions.get(top)
+                if row is None:
+                    # Mismatching terminal (or END)
+                    return False
+                alternative = row.get(token)
+                if alternative is None:
+                    return False
+                stack.extend(alternative)
+                top = stack.pop()
+
+        # Expand the remaining nonterminals to the empty string
+        top = stack.pop()
+        while top != END:
+            alternative = expansions.get(top, {}).get(END)
+            if alternative is None:
+                return False
+            stack.extend(alternative)
+            top = stack.pop()
+
+        return True
+
+    def to_pda(self,
+               verbose: bool = False,
+               alphabet: Iterable[str] = TOKENS) -> PDA:
+        """
+        Creates a deterministic PDA accepting the same language, reading one
+        token per transition. Expanding nonterminals is folded into the
+        transitions: on token a, the top of the stack is replaced by what
+        remains of its leftmost derivation after matching a. This requires an
+        ϵ-free grammar (no nullable nonterminals).
+
+        Stack symbols carry a '⊥' suffix when they lie directly on the bottom
+        of the stack, so the PDA knows when a transition empties the stack
+        (apart from '⊥') and can enter the final state 'accept'. Tokens that
+        cannot be parsed lead to the state 'dead'.
+
+        Sigma holds the terminals, the tokens in 'alphabet' and the
+        nonterminals, so that every such token that is not a terminal leads to
+        'dead' as well. Like any PDA, it leaves tokens outside Sigma unread.
+        """
+        nonterminals = list(self.table)
+        for nonterminal, row in self.table.items():
+            if END in row or any(not alternative
+                                 for alternative in row.values()):
+                raise GrammarError(f"Nonterminal '{nonterminal}' is "
+                                   "nullable, to_pda requires an ϵ-free "
+                                   "grammar")
+
+        def remainder(symbol: str, token: str) -> tuple[str, ...] | None:
+            # What remains of 'symbol' after matching 'token', None if the
+            # token cannot be matched
+            if symbol not in self.table:
+                return () if symbol == token else None
+            alternative = self.table[symbol].get(token)
+            if alternative is None:
+                return None
+            rest = remainder(alternative[0], token)
+            return None if rest is None else rest + tuple(alternative[1:])
+
+        def on_bottom(symbols: tuple[str, ...]) -> list[str]:
+            return list(symbols[:-1]) + [symbols[-1] + '⊥']
+
+        symbols = nonterminals + self.terminals
+        Gamma = ['⊥'] + symbols + [symbol + '⊥' for symbol in symbols]
+        Sigma = list(self.terminals)
+        for token in [*alphabet, *nonterminals]:
+            if token not in Sigma:
+                Sigma.append(token)
+
+        delta = []
+        for token in Sigma:
+            rest = remainder(self.start, token)
+            if rest is None:
+                delta.append((('start', token, '⊥'), ('dead', ['⊥'])))
+            elif not rest:
+                delta.append((('start', token, '⊥'), ('accept', ['⊥'])))
+            else:
+                delta.append((('start', token, '⊥'),
+                              ('q', on_bottom(rest) + ['⊥'])))
+            delta.append((('accept', token, '⊥'), ('dead', ['⊥'])))
+
+            for symbol in symbols:
+                rest = remainder(symbol, token)
+                if rest is None:
+                    delta.append((('q', token, symbol), ('dead', [symbol])))
+                    delta.append((('q', token, symbol + '⊥'),
+                                  ('dead', [symbol + '⊥'])))
+                elif not rest:
+                    delta.append((('q', token, symbol), ('q', 'ϵ')))
+                    delta.append((('q', token, symbol + '⊥'),
+                                  ('accept', 'ϵ')))
+                else:
+                    delta.append((('q', token, symbol), ('q', list(rest))))
+                    delta.append((('q', token, symbol + '⊥'),
+                                  ('q', on_bottom(rest))))
+
+        Q = ['start', 'q', 'accept', 'dead']
+        return PDA(Q, Sigma, Gamma, delta, 'start', ['accept'],
+                   'final_state', verbose)
+
+
+def compile_grammar(grammar: Grammar,
+                    cache_dir: Path | None = None) -> LL1Parser:
+    """
+    Compiles 'grammar' into an LL1Parser. The parse table is cached as JSON in
+    'cache_dir' (no caching if None, e.g. DEFAULT_CACHE_DIR), keyed by the
+    hash of the grammar.
+    """
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = cache_dir / f"{grammar.key()}.json"
+        try:
+            with cache_file.open(encoding='utf-8') as f:
+                cached = json.load(f)
+            return LL1Parser(cached['table'], cached['start'],
+                             cached['terminals'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    parser = LL1Parser(grammar.ll1_table(), grammar.start, grammar.terminals)
+
+    if cache_file is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        temporary = cache_file.with_suffix(f'.{os.getpid()}.tmp')
+        with temporary.open('w', encoding='utf-8') as f:
+            json.dump({'table': parser.table, 'start': parser.start,
+                       'terminals': parser.terminals}, f)
+        os.replace(temporary, cache_file)
+
+    return parser
+
+
+def main(grammar_file: Path, file: Path, pda: bool = False,
+         verbose: bool = False, cache: bool = False) -> None:
+    """
+    Compiles the grammar in 'grammar_file' (see Grammar.from_text) and checks
+    the tokenized traces in 'file' against it.
+    If 'pda' is set, the traces are checked by the PDA of the grammar instead,
+    reading every token that occurs in 'file' (see LL1Parser.to_pda).
+    If 'cache' is set, the parse table is cached in DEFAULT_CACHE_DIR.
+    """
+    with grammar_file.open(encoding='utf-8') as f:
+        grammar = Grammar.from_text(f.read())
+    parser = compile_grammar(grammar, DEFAULT_CACHE_DIR if cache else None)
+
+    with file.open(encoding='utf-8') as f:
+        traces = [line.split() for line in f]
+
+    my_pda = None
+    if pda:
+        tokens = {token for trace in traces for token in trace}
+        my_pda = parser.to_pda(verbose, TOKENS + sorted(tokens))
+
+    for trace in traces:
+        if my_pda is not None:
+            my_pda.reset()
+            correct = my_pda.transition_all(trace)
+        else:
+            correct = parser.accepts(trace)
+        print(f"Trace  : \"{trace}\"")
+        print(f"Grammar: {correct}")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Checks TM traces against a context-free grammar')
+    parser.add_argument('-p', '--pda', action='store_true',
+                        help='check the traces with the PDA of the grammar')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='enable verbose mode of PDA')
+    parser.add_argument('-c', '--cache', action='store_true',
+                        help=f'cache the parse table in {DEFAULT_CACHE_DIR}')
+    parser.add_argument('grammarfile', type=Path,
+                        help='file containing the grammar')
+    parser.add_argument('tracefile', type=Path,
+                        help='file containing tokenized traces')
+    args = parser.parse_args()
+    main(args.grammarfile, args.tracefile, args.pda, args.verbose,
+         args.cache)
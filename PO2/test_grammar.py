@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#  Framework for Automaten en Formele Talen             #
+#  Written by: Robin Visser & Tristan Laan              #
+#  based on work by: Bas van den Heuvel & Daan de Graaf #
+#                                                       #
+#  This work is licensed under a Creative Commons       #
+#  “Attribution-ShareAlike 4.0 International”  license. #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# Behaviour tests for grammar.py, run with: python -m pytest
+
+from grammar import END, Grammar, GrammarError, compile_grammar
+import itertools
+import pytest
+
+STEPS = """
+S -> READ X WRITE
+X -> SYMBOL | LEM
+"""
+
+BALANCED = "S -> MLEFT S MRIGHT S | ϵ"
+
+
+def parser(text: str):
+    return compile_grammar(Grammar.from_text(text))
+
+
+def pda_accepts(pda, tokens: list[str]) -> bool:
+    pda.reset()
+    return pda.transition_all(tokens)
+
+
+def test_accepts_sentences():
+    steps = parser(STEPS)
+    assert steps.accepts(['READ', 'SYMBOL', 'WRITE'])
+    assert steps.accepts(['READ', 'LEM', 'WRITE'])
+    assert not steps.accepts([])
+    assert not steps.accepts(['READ', 'SYMBOL'])
+    assert not steps.accepts(['READ', 'SYMBOL', 'WRITE', 'WRITE'])
+
+
+def test_accepts_nullable():
+    balanced = parser(BALANCED)
+    assert balanced.accepts([])
+    assert balanced.accepts(['MLEFT', 'MRIGHT', 'MLEFT', 'MRIGHT'])
+    assert balanced.accepts(['MLEFT', 'MLEFT', 'MRIGHT', 'MRIGHT'])
+    assert not balanced.accepts(['MRIGHT', 'MLEFT'])
+    assert not balanced.accepts(['MLEFT'])
+
+
+@pytest.mark.parametrize('tokens', [
+    ['S'], ['X'], ['READ', 'X', 'WRITE'], ['READ', 'S', 'WRITE'],
+    [END], [END, 'READ'], ['READ', 'SYMBOL', 'WRITE', END],
+    ['READ', 'BLANK', 'WRITE'], ['FOO'], ['READ', 'SYMBOL', 'FOO', 'WRITE']])
+def test_accepts_rejects_non_terminals(tokens):
+    assert not parser(STEPS).accepts(tokens)
+    assert not pda_accepts(parser(STEPS).to_pda(alphabet=tokens), tokens)
+
+
+def test_accepts_nullable_rejects_non_terminals():
+    balanced = parser(BALANCED)
+    assert not balanced.accepts(['S'])
+    assert not balanced.accepts([END])
+    assert not balanced.accepts(['MLEFT', 'MRIGHT', 'READ'])
+
+
+def test_to_pda_matches_accepts():
+    steps = parser(STEPS)
+    pda = steps.to_pda()
+    alphabet = ['READ', 'WRITE', 'SYMBOL', 'LEM', 'MLEFT']
+    for length in range(5):
+        for tokens in itertools.product(alphabet, repeat=length):
+            tokens = list(tokens)
+            assert pda_accepts(pda, tokens) == steps.accepts(tokens), tokens
+
+
+def test_to_pda_rejects_foreign_tokens():
+    pda = parser(STEPS).to_pda()
+    assert pda_accepts(pda, ['READ', 'SYMBOL', 'WRITE'])
+    assert not pda_accepts(pda, ['READ', 'SYMBOL', 'WRITE', 'MLEFT'])
+    assert not pda_accepts(pda, ['MLEFT', 'READ', 'SYMBOL', 'WRITE'])
+    assert not pda_accepts(pda, ['READ', 'MRIGHT', 'SYMBOL', 'WRITE'])
+    # Tokens named like a nonterminal are in Sigma as well
+    assert not pda_accepts(pda, ['S'])
+    assert not pda_accepts(pda, ['READ', 'X', 'WRITE'])
+
+
+def test_to_pda_requires_epsilon_free():
+    with pytest.raises(GrammarError):
+        parser(BALANCED).to_pda()
@@ -8,31 +8,33 @@
 #  “Attribution-ShareAlike 4.0 International”  license. #
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-from PDA import PDA
+from PDA import PDA, PDAError
+from collections.abc import Sequence
+from contextlib import redirect_stdout
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
+import io
+import sys
 
+# The trace memo is shared with PO1. A submission ships a copy of it next to
+# this file instead, see create_submission.sh
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'PO1'))
+from memo import TraceMemo, fingerprint, trace_digest
 
-def verify_movement(trace: list[str], verbose=True) -> bool:
-    """
-    Creates and uses a PDA to verify proper Turing machine (TM) movement in a
-    single execution trace
-    trace: A list of events (tokens)
-    returns: True if the trace behaviour is valid, False otherwise
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is only needed for the prefix sum movement verifier
+    np = None
 
-    Examples:
-    >>> verify_movement(['READ', 'LEM', 'WRITE', 'BLANK', 'MRIGHT', 'READ',
-                         'SYMBOL', 'WRITE', 'SYMBOL', 'MLEFT', 'READ',
-                         'SYMBOL', 'WRITE', 'SYMBOL', 'MRIGHT'])
-    True
 
-    >>> verify_movement(['READ', 'LEM', 'WRITE', 'LEM', 'MRIGHT', 'READ',
-                         'SYMBOL', 'WRITE', 'SYMBOL', 'MRIGHT', 'READ',
-                         'SYMBOL', 'WRITE', 'SYMBOL', 'MLEFT', 'READ',
-                         'SYMBOL', 'WRITE', 'SYMBOL', 'MLEFT', 'READ', 'LEM',
-                         'WRITE', 'BLANK', 'MLEFT'])
-    False
+@lru_cache(maxsize=None)
+def movement_pda(verbose=True) -> PDA:
+    """
+    Creates the PDA verifying proper Turing machine (TM) movement, see
+    verify_movement. The PDA is created once; reset it before every trace.
     """
-
     ### Build and explain your PDA here... (see PDA.py)
     # In this PDA we only care about 'MLEFT' and 'MRIGHT'
     # only two states: final and dead
@@ -64,44 +66,108 @@ def verify_movement(trace: list[str], verbose=True) -> bool:
     F = ['final']
     pda_type = 'final_state'
 
-    my_pda = PDA(Q, Sigma, Gamma, delta, s, F, pda_type, verbose)
+    # The stack holds one MRIGHT per cell right of the endmarker, so store it
+    # as runs of equal symbols
+    my_pda = PDA(Q, Sigma, Gamma, delta, s, F, pda_type, verbose,
+                 run_length_stack=True)
 
-    # Note: you can use my_pda.transition(symbol) to test a single transition.
-
-    return my_pda.transition_all(trace)
+    return my_pda
 
 
-def verify_lem(trace: list[str], verbose=True) -> bool:
+def verify_movement(trace: list[str], verbose=True) -> bool:
     """
-    Creates and uses a PDA to verify Turing machine (TM) left endmarker for a
-    single execution trace
+    Uses the PDA of movement_pda to verify proper Turing machine (TM) movement
+    in a single execution trace
     trace: A list of events (tokens)
     returns: True if the trace behaviour is valid, False otherwise
 
     Examples:
-    >>> verify_lem(['READ', 'LEM', 'WRITE', 'BLANK', 'MRIGHT'])
-    False
-
-    >>> verify_lem(['READ', 'LEM', 'WRITE', 'LEM', 'MRIGHT', 'READ', 'SYMBOL',
-                    'WRITE', 'LEM', 'MRIGHT'])
+    >>> verify_movement(['READ', 'LEM', 'WRITE', 'BLANK', 'MRIGHT', 'READ',
+                         'SYMBOL', 'WRITE', 'SYMBOL', 'MLEFT', 'READ',
+                         'SYMBOL', 'WRITE', 'SYMBOL', 'MRIGHT'])
     True
 
-    >>> verify_lem(['READ', 'LEM', 'WRITE', 'LEM', 'MRIGHT', 'READ', 'SYMBOL',
-                    'WRITE', 'LEM', 'MLEFT'])
+    >>> verify_movement(['READ', 'LEM', 'WRITE', 'LEM', 'MRIGHT', 'READ',
+                         'SYMBOL', 'WRITE', 'SYMBOL', 'MRIGHT', 'READ',
+                         'SYMBOL', 'WRITE', 'SYMBOL', 'MLEFT', 'READ',
+                         'SYMBOL', 'WRITE', 'SYMBOL', 'MLEFT', 'READ', 'LEM',
+                         'WRITE', 'BLANK', 'MLEFT'])
     False
+    """
 
-    >>> verify_lem(['READ', 'LEM', 'WRITE', 'LEM', 'MRIGHT', 'READ', 'SYMBOL',
-                    'WRITE', 'LEM', 'MRIGHT', 'READ', 'SYMBOL', 'WRITE',
-                    'SYMBOL', 'MLEFT', 'READ', 'LEM', 'WRITE', 'BLANK',
-                    'MRIGHT'])
-    False
+    my_pda = movement_pda(verbose)
+    my_pda.reset()
 
-    >>> verify_lem(['READ', 'LEM', 'WRITE', 'LEM', 'MRIGHT', 'READ', 'SYMBOL',
-                    'WRITE', 'BLANK', 'MRIGHT', 'READ', 'LEM', 'WRITE', 'LEM',
-                    'MRIGHT'])
-    False
+    # Note: you can use my_pda.transition(symbol) to test a single transition.
+
+    return my_pda.transition_all(trace)
+
+
+def head_moves(tokens: 'np.ndarray') -> 'np.ndarray':
+    """
+    Maps an array of tokens to the moves of the head: +1 for MRIGHT, -1 for
+    MLEFT and 0 for any other token
+    """
+    return ((tokens == 'MRIGHT').astype(np.int64) -
+            (tokens == 'MLEFT').astype(np.int64))
+
+
+def verify_movement_numpy(trace: list[str]) -> bool:
+    """
+    Verifies proper Turing machine (TM) movement like verify_movement, without
+    a PDA: the head never moves left of the left endmarker if and only if
+    every prefix of the trace has at least as many MRIGHT as MLEFT tokens,
+    i.e. the prefix sums of the head moves are never negative.
+    trace: A list of events (tokens)
+    returns: True if the trace behaviour is valid, False otherwise
+    """
+    if np is None:
+        raise PDAError("NumPy is required for verify_movement_numpy")
+
+    if not trace:
+        return True
+
+    positions = np.cumsum(head_moves(np.array(trace, dtype=object)))
+    return bool(positions.min() >= 0)
+
+
+def verify_movement_batch(traces: Sequence[list[str]]) -> 'np.ndarray':
+    """
+    Verifies the movement of all 'traces' at once, see verify_movement_numpy.
+    The traces are concatenated into one array with the offset of every
+    trace, a single prefix sum runs over all of them, and the minimum of
+    every trace is compared to the position at its start.
+    returns: A boolean NumPy array, True for every valid trace
     """
+    if np is None:
+        raise PDAError("NumPy is required for verify_movement_batch")
+
+    lengths = np.array([len(trace) for trace in traces], dtype=np.intp)
+    starts = np.cumsum(lengths) - lengths
+    valid = np.ones(len(traces), dtype=bool)
+    if not lengths.any():
+        return valid
+
+    positions = np.cumsum(head_moves(
+        np.array(list(chain(*traces)), dtype=object)))
+    # Position of the head before every trace
+    offsets = np.concatenate(([0], positions))[starts]
+
+    # Every segment of reduceat runs up to the start of the next nonempty
+    # trace, so empty traces are left out
+    nonempty = lengths > 0
+    minima = np.minimum.reduceat(positions, starts[nonempty])
+    valid[nonempty] = minima >= offsets[nonempty]
 
+    return valid
+
+
+@lru_cache(maxsize=None)
+def lem_pda(verbose=True) -> PDA:
+    """
+    Creates the PDA verifying the Turing machine (TM) left endmarker, see
+    verify_lem. The PDA is created once; reset it before every trace.
+    """
     ### Build and explain your PDA here... (see PDA.py)
     # When PDA is in P1 state, it means
     # Characters for initial stack symbol and epsilon: ⊥ , ϵ
@@ -173,35 +239,141 @@ def verify_lem(trace: list[str], verbose=True) -> bool:
 
     my_pda = PDA(Q, Sigma, Gamma, delta, s, F, pda_type, verbose)
 
+    return my_pda
+
+
+def verify_lem(trace: list[str], verbose=True) -> bool:
+    """
+    Uses the PDA of lem_pda to verify the Turing machine (TM) left endmarker
+    for a single execution trace
+    trace: A list of events (tokens)
+    returns: True if the trace behaviour is valid, False otherwise
+
+    Examples:
+    >>> verify_lem(['READ', 'LEM', 'WRITE', 'BLANK', 'MRIGHT'])
+    False
+
+    >>> verify_lem(['READ', 'LEM', 'WRITE', 'LEM', 'MRIGHT', 'READ', 'SYMBOL',
+                    'WRITE', 'LEM', 'MRIGHT'])
+    True
+
+    >>> verify_lem(['READ', 'LEM', 'WRITE', 'LEM', 'MRIGHT', 'READ', 'SYMBOL',
+                    'WRITE', 'LEM', 'MLEFT'])
+    False
+
+    >>> verify_lem(['READ', 'LEM', 'WRITE', 'LEM', 'MRIGHT', 'READ', 'SYMBOL',
+                    'WRITE', 'LEM', 'MRIGHT', 'READ', 'SYMBOL', 'WRITE',
+                    'SYMBOL', 'MLEFT', 'READ', 'LEM', 'WRITE', 'BLANK',
+                    'MRIGHT'])
+    False
+
+    >>> verify_lem(['READ', 'LEM', 'WRITE', 'LEM', 'MRIGHT', 'READ', 'SYMBOL',
+                    'WRITE', 'BLANK', 'MRIGHT', 'READ', 'LEM', 'WRITE', 'LEM',
+                    'MRIGHT'])
+    False
+    """
+
+    my_pda = lem_pda(verbose)
+    my_pda.reset()
+
     # Note: you can use my_pda.transition(symbol) to test a single transition.
 
     return my_pda.transition_all(trace)
 
 
-def main(file: Path, verbose: bool = True) -> None:
+def verify_trace(trace: list[str],
+                 verbose=True) -> tuple[bool, bool | None]:
+    """
+    Verifies both the movement and the left endmarker of a single execution
+    trace in one pass, advancing both PDAs in lockstep.
+    Reading stops as soon as the movement is rejected, or both verdicts are
+    decided (see PDA.verdict). Once the left endmarker is rejected only the
+    movement PDA continues, as its verdict is still reported.
+    In verbose mode the transitions of each PDA are buffered and printed
+    below a header per PDA, rather than interleaved.
+    trace: A list of events (tokens)
+    returns: The verdicts of verify_movement and verify_lem, the latter None
+             if the movement is invalid
     """
-    Reads multiple tokenized traces from the file at 'path' and feeds them to
-    the various verification functions.
+    movement = movement_pda(verbose)
+    lem = lem_pda(verbose)
+    movement.reset()
+    lem.reset()
+    movement_output = io.StringIO()
+    lem_output = io.StringIO()
+
+    def step(pda: PDA, output: io.StringIO, symbol: str) -> bool | None:
+        if not verbose:
+            return pda.step(symbol)
+        with redirect_stdout(output):
+            return pda.step(symbol)
+
+    try:
+        movement_correct = lem_correct = None
+        for symbol in trace:
+            if movement_correct is None:
+                movement_correct = step(movement, movement_output, symbol)
+                if movement_correct is False:
+                    return False, None
+            if lem_correct is None:
+                lem_correct = step(lem, lem_output, symbol)
+            if movement_correct is not None and lem_correct is not None:
+                break
+
+        if movement_correct is None:
+            movement_correct = movement.is_accepting()
+        if not movement_correct:
+            return False, None
+
+        if lem_correct is None:
+            lem_correct = lem.is_accepting()
+
+        return True, lem_correct
+    finally:
+        if verbose:
+            print("Movement PDA   :")
+            print(movement_output.getvalue(), end='')
+            print("Lem PDA        :")
+            print(lem_output.getvalue(), end='')
+
+
+def main(file: Path, verbose: bool = True, stats: bool = False) -> None:
+    """
+    Reads multiple tokenized traces from the file at 'path' and verifies them
+    in a single pass with verify_trace. The verdicts of the movement are
+    printed for every trace, followed by the verdicts of the left endmarker
+    for the traces with a valid movement.
+    Verdicts are memoized per trace content and PDAs, so repeated traces are
+    only verified once. In verbose mode every trace is verified, so the
+    output of the PDAs is printed for every trace. If 'stats' is set, the hit
+    rates of the memo are printed to stderr.
     """
     # Read and parse traces.
     with file.open(encoding='utf-8') as f:
         traces = [trace.split() for trace in [line.rstrip('\n') for line in f]]
 
-    # Verify traces using verification functions
+    memo = TraceMemo()
+    trace_key = (f"verify_trace {fingerprint(movement_pda(verbose))} "
+                 f"{fingerprint(lem_pda(verbose))}")
+
     valid_movement = []
     for trace in traces:
         print(f"Trace          : \"{trace}\"")
-        movement_correct = verify_movement(trace, verbose)
+        if verbose:
+            movement_correct, lem_correct = verify_trace(trace, verbose)
+        else:
+            movement_correct, lem_correct = memo.get(
+                trace_key, trace_digest(trace),
+                lambda: verify_trace(trace, verbose))
         print(f"Verify movement: {movement_correct}")
         if movement_correct:
-            valid_movement.append(trace)
+            valid_movement.append((trace, lem_correct))
 
     print()
 
     valid_lem = []
-    for trace in valid_movement:
+    for trace, lem_correct in valid_movement:
         print(f"Trace          : \"{trace}\"")
-        lem_correct = verify_lem(trace, verbose)
         print(f"Verify lem     : {lem_correct}")
         if lem_correct:
             valid_lem.append(trace)
@@ -211,13 +383,18 @@ def main(file: Path, verbose: bool = True) -> None:
     for trace in valid_lem:
         print(trace)
 
+    if stats:
+        print(memo.report(), file=sys.stderr)
+
 
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser(description='Verifies a TM trace')
     parser.add_argument('-n', '--no-verbose', action='store_true',
                         help='disable verbose mode of PDA')
+    parser.add_argument('-s', '--stats', action='store_true',
+                        help='print the hit rates of the trace memo')
     parser.add_argument('tracefile', type=Path,
                         help='file containing tokenized traces')
     args = parser.parse_args()
-    main(args.tracefile, not args.no_verbose)
+    main(args.tracefile, not args.no_verbose, args.stats)
@@ -9,6 +9,10 @@
 
 # DO NOT MODIFY THIS FILE
 
+from array import array
+from collections.abc import Sequence
+from typing import TextIO
+
 
 class TMError(Exception):
     pass
@@ -45,7 +49,8 @@ class TM:
                  t: str,
                  r: str,
                  verbose: bool = False,
-                 no_halt: int = 1000):
+                 no_halt: int = 1000,
+                 trace_sink: TextIO | None = None):
         """
         Creates the TM object and performs input sanitization
 
@@ -71,6 +76,10 @@ class TM:
 
         no_halt: The amount of steps the TM is allowed to make before it is
                  assumed that it will not halt
+
+        trace_sink: An optional text file the execution trace is streamed to
+                 instead of being kept in memory (see Tape), one line per
+                 input
         """
 
         # Verify that Gamma contains the left endmarker and blank symbol
@@ -145,6 +154,7 @@ class TM:
         self.tape_alphabet = Gamma
         self.verbose = verbose
         self.max_steps = no_halt
+        self.trace_sink = trace_sink
         self.start_state = self.states[s]
         self.accept_state = self.states[t]
         self.reject_state = self.states[r]
@@ -162,7 +172,13 @@ class TM:
         """
         Reset the TM
         """
-        self.tape = Tape([] if self.input is None else self.input)
+        # Finish the trace of the previous input, if any, on its own line
+        self.tape.flush()
+        if self.trace_sink is not None and self.tape.written:
+            self.trace_sink.write('\n')
+
+        self.tape = Tape([] if self.input is None else self.input,
+                         self.trace_sink)
         self.current_state = self.start_state
         self.step_counter = 0
 
@@ -284,11 +300,21 @@ class TM:
     def get_execution_trace(self) -> str:
         """
         Retrieve a string representing the execution trace of the steps that
-        the TM has taken so far
+        the TM has taken so far. With a trace sink, the trace is written to
+        the sink instead and the empty string is returned.
         """
+        self.tape.flush()
+
         # Omit the final space
         return self.tape.execution_trace[:-1]
 
+    def compile(self) -> 'CompiledTM':
+        """
+        Compile the TM into an integer-coded transition table
+        returns: A CompiledTM making the same steps as this TM
+        """
+        return CompiledTM(self)
+
     @staticmethod
     def visualize(trace_input: str, trace: str) -> None:
         """
@@ -326,6 +352,181 @@ class TM:
         print("Reached the end of the execution trace")
 
 
+class CompiledTM:
+    """
+    Turing machine (TM) compiled to integer codes
+
+    States and tape symbols are interned to small integers, the tape is a
+    bytearray (or an array('H') for large tape alphabets) of symbol codes, and
+    the transition relation is flattened into tables indexed by
+    state * width + symbol. A run records only the table index of every step
+    and renders the tape contents and execution trace when they are
+    requested. Runs give the same results, tapes, traces and exceptions as
+    TM.transition_all, but have no verbose mode.
+    """
+
+    def __init__(self, tm: TM):
+        """
+        tm: The TM to compile
+        """
+        self.state_names = list(tm.states)
+        self.symbol_names = list(dict.fromkeys(tm.tape_alphabet))
+        state_codes = {name: code
+                       for code, name in enumerate(self.state_names)}
+        self.symbol_codes = {name: code
+                             for code, name in enumerate(self.symbol_names)}
+        self.width = len(self.symbol_names)
+
+        # Tables indexed by state * width + symbol, -1 for a missing
+        # transition
+        size = len(self.state_names) * self.width
+        self.next_states = [-1] * size
+        self.writes = [0] * size
+        self.moves = [0] * size
+        # The execution trace of every transition
+        self.trace_steps = [""] * size
+        for name, state in tm.states.items():
+            for symbol, (new_state, new_symbol, movement) in \
+                    state.transition_table.items():
+                index = (state_codes[name] * self.width +
+                         self.symbol_codes[symbol])
+                self.next_states[index] = state_codes[new_state]
+                self.writes[index] = self.symbol_codes[new_symbol]
+                self.moves[index] = 1 if movement == 'R' else -1
+                self.trace_steps[index] = (
+                    f"- {symbol} + {new_symbol} "
+                    f"{'>' if movement == 'R' else '<'} ")
+
+        self.input_alphabet = tm.input_alphabet
+        self.max_steps = tm.max_steps
+        self.start = state_codes[tm.start_state.name]
+        self.accept = state_codes[tm.accept_state.name]
+        self.reject = state_codes[tm.reject_state.name]
+        self.endmarker = self.symbol_codes['⊢']
+        self.blank = self.symbol_codes['⊔']
+
+        self.state = self.start
+        self.tape = self.new_tape([self.endmarker])
+        self.index = 0
+        self.steps = array('L')
+        # The trace of a step interrupted by an exception
+        self.trace_tail = ""
+        self.step_counter = 0
+
+    def new_tape(self, symbols: list[int]) -> bytearray | array:
+        """ Tape holding the symbol codes 'symbols' """
+        if self.width <= 256:
+            return bytearray(symbols)
+        return array('H', symbols)
+
+    def run(self,
+            input: Sequence[str],
+            max_steps: int | None = None) -> bool:
+        """
+        Write 'input' on the tape and take TM steps until the input is
+        accepted or rejected, like TM.set_input followed by
+        TM.transition_all.
+        max_steps: The amount of steps the TM is allowed to make before it is
+                   assumed that it will not halt (default: no_halt of the TM)
+        returns: True if the input is accepted, False if rejected.
+        """
+        for element in input:
+            if element not in self.input_alphabet:
+                raise InputError(f"Input symbol '{element}' not in input "
+                                 "alphabet")
+
+        if max_steps is None:
+            max_steps = self.max_steps
+
+        symbol_codes = self.symbol_codes
+        next_states = self.next_states
+        writes = self.writes
+        moves = self.moves
+        width = self.width
+        accept = self.accept
+        reject = self.reject
+        endmarker = self.endmarker
+        blank = self.blank
+
+        tape = self.new_tape([endmarker] +
+                             [symbol_codes[element] for element in input])
+        size = len(tape)
+        steps = array('L')
+        record = steps.append
+        state = self.start
+        index = 0
+        count = 0
+        tail = ""
+        try:
+            while state != accept and state != reject:
+                if count > max_steps:
+                    raise LogicError(f"The TM has taken more than {max_steps}"
+                                     " steps without entering the accept or "
+                                     "reject state, it is unlikely to halt!")
+
+                symbol = tape[index]
+                step = state * width + symbol
+                new_state = next_states[step]
+                if new_state < 0:
+                    tail = f"- {self.symbol_names[symbol]}"
+                    raise TMError(f"State '{self.state_names[state]}' has no "
+                                  "transition for current tape symbol "
+                                  f"'{self.symbol_names[symbol]}', the TM has "
+                                  "stalled")
+
+                new_symbol = writes[step]
+                if not index and new_symbol != endmarker:
+                    tail = f"- {self.symbol_names[symbol]}"
+                    raise TapeError("The TM has overwritten the left "
+                                    "endmarker at the leftmost piece of tape")
+                tape[index] = new_symbol
+
+                if moves[step] > 0:
+                    index += 1
+                    if index == size:
+                        tape.append(blank)
+                        size += 1
+                elif index:
+                    index -= 1
+                else:
+                    tail = (f"- {self.symbol_names[symbol]} + "
+                            f"{self.symbol_names[new_symbol]}")
+                    raise TapeError("The TM has moved off the tape")
+
+                record(step)
+                state = new_state
+                count += 1
+        finally:
+            self.state = state
+            self.tape = tape
+            self.index = index
+            self.steps = steps
+            self.trace_tail = tail
+            self.step_counter = count
+
+        return state == accept
+
+    def current_name(self) -> str:
+        """ Name of the current state """
+        return self.state_names[self.state]
+
+    def get_tape_contents(self) -> list[str]:
+        """
+        Retrieve a list representing the finite part of the tape touched by
+        the last run
+        """
+        return [self.symbol_names[symbol] for symbol in self.tape]
+
+    def get_execution_trace(self) -> str:
+        """
+        Retrieve a string representing the execution trace of the last run
+        """
+        trace = ''.join(map(self.trace_steps.__getitem__, self.steps))
+
+        # Omit the final space
+        return (trace + self.trace_tail)[:-1]
+
+
 class State:
     """State in a Turing machine (TM)"""
     def __init__(self,
@@ -356,9 +557,20 @@ class TapeError(Exception):
 class Tape:
     """
     Tape (and head) of a Turing machine (TM)
-    The tape also keeps track of the produced execution trace.
+    The tape also keeps track of the produced execution trace. The trace is
+    recorded as a list of chunks, appended in O(1). Every 'flush_size' chunks
+    are joined into a single block, so a long trace costs a few bytes per
+    step rather than a string object per chunk, and the blocks are only
+    joined into a single string when the execution_trace is read.
+    If a trace sink (a text file) is given, the chunks are written to it every
+    'flush_size' chunks rather than kept, except for the last character, so
+    that the sink ends up with the trace without its final space. The
+    execution_trace then only holds the part not yet written.
     """
-    def __init__(self, tm_input: list[str]):
+    def __init__(self,
+                 tm_input: list[str],
+                 trace_sink: TextIO | None = None,
+                 flush_size: int = 1 << 12):
 
         # The (initial) relevant 'finite' part of the tape
         self.tape_actual = ['⊢']
@@ -369,7 +581,48 @@ class Tape:
         # The current index of the TM head
         self.index = 0
 
-        self.execution_trace = ""
+        # Joined blocks of the trace, followed by the chunks appended since
+        self.trace_blocks = []
+        self.trace_chunks = []
+        self.trace_sink = trace_sink
+        self.flush_size = flush_size
+        # Whether any of the trace has been written to the sink
+        self.written = False
+
+    @property
+    def execution_trace(self) -> str:
+        """ The execution trace, rendered from its blocks and chunks """
+        self.join_chunks()
+        blocks = self.trace_blocks
+        if len(blocks) > 1:
+            # Keep the rendered trace, so it is joined only once
+            blocks[:] = [''.join(blocks)]
+        return blocks[0] if blocks else ""
+
+    @execution_trace.setter
+    def execution_trace(self, trace: str) -> None:
+        self.trace_blocks = [trace] if trace else []
+        self.trace_chunks = []
+
+    def join_chunks(self) -> None:
+        """ Join the chunks appended since the last block into a block """
+        if self.trace_chunks:
+            self.trace_blocks.append(''.join(self.trace_chunks))
+            self.trace_chunks = []
+
+    def flush(self) -> None:
+        """
+        Write the execution trace to the trace sink (if any), holding back
+        the last character, which is the final space once the TM halts
+        """
+        if self.trace_sink is None:
+            return
+
+        trace = self.execution_trace
+        if len(trace) > 1:
+            self.trace_sink.write(trace[:-1])
+            self.execution_trace = trace[-1]
+            self.written = True
 
     def __str__(self) -> str:
         # Assume a monospace terminal font.
@@ -396,7 +649,7 @@ class Tape:
     def read(self) -> str:
         """ Read tape contents at the current position of the head """
 
-        self.execution_trace += "- " + self.tape_actual[self.index]
+        self.trace_chunks.append("- " + self.tape_actual[self.index])
         return self.tape_actual[self.index]
 
     def write(self, symbol: str) -> None:
@@ -407,7 +660,7 @@ class Tape:
             raise TapeError("The TM has overwritten the left endmarker at the "
                             "leftmost piece of tape")
 
-        self.execution_trace += " + " + symbol
+        self.trace_chunks.append(" + " + symbol)
         self.tape_actual[self.index] = symbol
 
     def move(self, direction) -> None:
@@ -418,12 +671,18 @@ class Tape:
                 # Extend the finite part of the tape
                 self.tape_actual.append('⊔')
             self.index += 1
-            self.execution_trace += " > "
+            self.trace_chunks.append(" > ")
         elif direction == 'L':
             # Check if we are at the beginning of the tape
             if self.index == 0:
                 raise TapeError("The TM has moved off the tape")
             self.index -= 1
-            self.execution_trace += " < "
+            self.trace_chunks.append(" < ")
         else:
             raise TapeError(f"Movement '{direction}' is neither 'L' nor 'R'")
+
+        if len(self.trace_chunks) >= self.flush_size:
+            if self.trace_sink is None:
+                self.join_chunks()
+            else:
+                self.flush()
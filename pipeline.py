@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#  Framework for Automaten en Formele Talen             #
+#  Written by: Robin Visser & Tristan Laan              #
+#  based on work by: Bas van den Heuvel & Daan de Graaf #
+#                                                       #
+#  This work is licensed under a Creative Commons       #
+#  “Attribution-ShareAlike 4.0 International”  license. #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# End-to-end verification of raw TM traces, chaining PO1 (lexing and step
+# verification) and PO2 (movement and left endmarker verification).
+
+import sys
+if sys.version_info < (3, 10):
+    print("pipeline.py requires Python 3.10 or newer. Cannot continue...")
+    sys.exit(1)
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path[:0] = [str(ROOT / 'PO1'), str(ROOT / 'PO2')]
+
+from collections.abc import Iterable, Iterator
+from contextlib import nullcontext
+from FA import FAError
+from typing import TextIO
+import lexer
+import verification
+import verify
+
+
+class Trace:
+    """
+    A trace in flight through the pipeline
+    """
+    __slots__ = ('number', 'text', 'lexed', 'tokens', 'rejected_by')
+
+    def __init__(self, number: int, text: str):
+        """
+        number: Line number of the trace (starting at 1)
+
+        text:   The raw trace
+        """
+        self.number = number
+        self.text = text
+        self.lexed = None
+        self.tokens = None
+        # Name of the stage that rejected the trace, None while valid
+        self.rejected_by = None
+
+
+def read(stream: TextIO) -> Iterator[Trace]:
+    """
+    Reads the traces in 'stream' one line at a time
+    """
+    for number, line in enumerate(stream, 1):
+        yield Trace(number, line.rstrip('\n'))
+
+
+def lex(traces: Iterable[Trace], verbose: bool = False) -> Iterator[Trace]:
+    """
+    Tokenizes every trace with the lexer of PO1, rejecting traces with
+    unacceptable characters or tokens
+    """
+    M = lexer.create_fa(verbose).compile()
+    for trace in traces:
+        if trace.rejected_by is None:
+            try:
+                trace.lexed = lexer.fast_lexer(M, trace.text)
+            except FAError:
+                trace.rejected_by = 'lexer'
+            else:
+                trace.tokens = [token for _, token in trace.lexed
+                                if token != 'SPACE']
+        yield trace
+
+
+def steps(traces: Iterable[Trace], verbose: bool = False) -> Iterator[Trace]:
+    """
+    Rejects the traces that are not sequences of complete steps, see
+    verify.verify_steps
+    """
+    M = verify.create_fa(verbose)
+    for trace in traces:
+        if (trace.rejected_by is None and
+                not verify.verify_steps(M, trace.lexed)):
+            trace.rejected_by = 'verify_steps'
+        # The lexemes are no longer needed
+        trace.lexed = None
+        yield trace
+
+
+def movement(traces: Iterable[Trace],
+             verbose: bool = False) -> Iterator[Trace]:
+    """
+    Rejects the traces that move left of the left endmarker, see
+    verification.verify_movement
+    """
+    for trace in traces:
+        if (trace.rejected_by is None and
+                not verification.verify_movement(trace.tokens, verbose)):
+            trace.rejected_by = 'verify_movement'
+        yield trace
+
+
+def lem(traces: Iterable[Trace], verbose: bool = False) -> Iterator[Trace]:
+    """
+    Rejects the traces that misuse the left endmarker, see
+    verification.verify_lem
+    """
+    for trace in traces:
+        if (trace.rejected_by is None and
+                not verification.verify_lem(trace.tokens, verbose)):
+            trace.rejected_by = 'verify_lem'
+        yield trace
+
+
+def pipeline(stream: TextIO, verbose: bool = False) -> Iterator[Trace]:
+    """
+    Chains the stages read -> lex -> steps -> movement -> lem. Every stage is
+    a generator that pulls a single trace from the previous one, so only one
+    trace is in flight at a time and reading never runs ahead of
+    verification. A rejected trace is passed through the later stages
+    without further verification.
+    returns: A generator yielding every trace once it is verified
+    """
+    traces = read(stream)
+    traces = lex(traces, verbose)
+    traces = steps(traces, verbose)
+    traces = movement(traces, verbose)
+    return lem(traces, verbose)
+
+
+def main(file: Path, verbose: bool = False, valid_only: bool = False) -> None:
+    """
+    Reads multiple traces from the file at 'file' (or stdin if 'file' is '-')
+    and prints the verdict of every trace as soon as it is verified.
+    If 'valid_only' is set, only the valid traces are printed.
+    """
+    if str(file) == '-':
+        context = nullcontext(sys.stdin)
+    else:
+        context = file.open(encoding='utf-8')
+
+    with context as f:
+        for trace in pipeline(f, verbose):
+            if trace.rejected_by is None:
+                print(f"{trace.number}: valid: \"{trace.text}\"", flush=True)
+            elif not valid_only:
+                print(f"{trace.number}: rejected by {trace.rejected_by}: "
+                      f"\"{trace.text}\"", flush=True)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Verifies raw TM traces from lexing to left endmarker')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='enable verbose mode of FAs and PDAs')
+    parser.add_argument('-o', '--valid-only', action='store_true',
+                        help='only print the valid traces')
+    parser.add_argument('tracefile', type=Path,
+                        help='file containing traces to verify, - for stdin')
+    args = parser.parse_args()
+    main(args.tracefile, args.verbose, args.valid_only)